@@ -1,13 +1,98 @@
+from array import array
+import collections
+import concurrent.futures
+import csv
+import json
+import math
+import os
+import re
+import time
+
 import cympy
 
+import FeederCache
+import Instrumentation
+
+# Line ID fields of conductor device types, bit of each line ID field in conductor table default bitmask
+LINE_ID_FIELDS = {cympy.enums.DeviceType.OverheadLine: ['LineID'],
+                  cympy.enums.DeviceType.OverheadByPhase: ['PhaseConductorIDA', 'PhaseConductorIDB',
+                                                           'PhaseConductorIDC', 'NeutralConductorID1',
+                                                           'NeutralConductorID2'],
+                  cympy.enums.DeviceType.OverheadLineUnbalanced: ['LineID'],
+                  cympy.enums.DeviceType.Underground: ['CableID']}
+LINE_ID_NAMES = ['LineID', 'PhaseConductorIDA', 'PhaseConductorIDB', 'PhaseConductorIDC',
+                 'NeutralConductorID1', 'NeutralConductorID2', 'CableID']
+LINE_ID_BITS = {line_id_name: 1 << bit for bit, line_id_name in enumerate(LINE_ID_NAMES)}
+
+# Planned line ID change of conductor
+ConductorChange = collections.namedtuple('ConductorChange', ['SECTION', 'FIELD', 'OLD', 'NEW'])
+
+# Changed and input required conductor records (CIRCUIT only set in batch results), result dictionaries keyed by
+# (section ID, line ID field) tuple
+ChangedConductor = collections.namedtuple('ChangedConductor', ['SECTION', 'OLD', 'NEW', 'LINEID', 'CIRCUIT'],
+                                          defaults=[None])
+InputRequiredConductor = collections.namedtuple('InputRequiredConductor',
+                                                ['SECTION', 'UPSTREAM', 'DOWNSTREAM', 'LINEID', 'ROW', 'CIRCUIT'],
+                                                defaults=[None])
+# Fields of records in reports and exports
+CHANGED_FIELDS = ['SECTION', 'OLD', 'NEW', 'LINEID']
+INPUT_REQUIRED_FIELDS = ['SECTION', 'UPSTREAM', 'DOWNSTREAM', 'LINEID']
+
+
+class DefaultMatcher(object):
+    """
+    Default conductor ID matcher, default IDs compiled once into one regex (conductor ID is default if it contains
+    any default ID), results memoized per distinct conductor ID
+    """
+
+    def __init__(self, default_ids):
+        """
+        Compiles default IDs
+        :param default_ids: Default conductor IDs list
+        """
+        self.default_ids = list(default_ids)
+        self.memo = {}
+        if self.default_ids:
+            # Longest first so alternation doesn't stop at shorter prefix of another default ID
+            self.pattern = re.compile('|'.join(re.escape(default_id)
+                                               for default_id in sorted(set(self.default_ids), key=len, reverse=True)))
+        else:
+            self.pattern = None
+
+    def match(self, cond_id):
+        """
+        Checks if conductor ID is a default conductor
+        :param cond_id: Conductor ID string (None is never default)
+        :return: Bool indicating if conductor ID is default
+        """
+        try:
+            return self.memo[cond_id]
+        except KeyError:
+            default_bool = cond_id is not None and self.pattern is not None and \
+                self.pattern.search(cond_id) is not None
+            self.memo[cond_id] = default_bool
+            return default_bool
+
+    def classify(self, cond_ids):
+        """
+        Checks which conductor IDs are default conductors
+        :param cond_ids: List of conductor ID strings
+        :return: List of bools indicating if each conductor ID is default
+        """
+        memo = self.memo
+        return [memo[cond_id] if cond_id in memo else self.match(cond_id) for cond_id in cond_ids]
+
 
 def check_default_cond(cond_id, default_ids):
     """
     Checks if conductor ID is a default conductor
     :param cond_id: Conductor ID string
-    :param default_ids: Default conductor IDs list
+    :param default_ids: Default conductor IDs list or DefaultMatcher
     :return: Bool indicating if conductor ID is valid or default
     """
+    if isinstance(default_ids, DefaultMatcher):
+        return default_ids.match(cond_id)
+
     default_bool = False
     for default_id in default_ids:
         if default_id in cond_id:
@@ -19,78 +104,395 @@ def check_default_cond(cond_id, default_ids):
 
 def get_conductors(ckt_name, cond_defaults):
     """
-    Gets dictionary of overhead line, overhead line by phase, overhead line unbalanced, and underground conductors
-    Key: section ID, value: conductor device object
+    Gets columnar table of overhead line, overhead line by phase, overhead line unbalanced, and underground conductors
+    (one row per section, line ID fields not used by device type are None)
+    Keys: SECTIONID, DEVICETYPE, DEVICENUMBER, every name in LINE_ID_NAMES, DEFAULT (bitmask of default line IDs,
+    see LINE_ID_BITS), ROW (dictionary of section ID to row)
+    :param ckt_name: String of circuit name
+    :param cond_defaults: List of default conductor IDs or DefaultMatcher
+    :return: Conductor table, list of rows of OH and OH unbalanced default conductors,
+    list of rows of OH by phase default conductors, list of rows of UG default cables
+    """
+    cond_table = list_conductors(ckt_name)
+    return (cond_table,) + classify_conductors(cond_table, cond_defaults)
+
+
+def list_conductors(ckt_name, conductors=None):
+    """
+    Lists conductors of circuit into conductor table (see get_conductors), DEFAULT not set
     :param ckt_name: String of circuit name
-    :param cond_defaults: List of default conductor IDs
-    :return: Dictionary of conductor devices, list of OH and OH unbalanced conductors, list of OH by phase conductors,
-    list of UG cables
-    """
-    # Initialize dictionary of conductors, lists of default conductors
-    cond_dict = {}
-    oh_default_list = []
-    oh_phase_default_list = []
-    oh_unbalanced_default_list = []
-    ug_cable_default_list = []
-
-    # Get list of all devices
-    oh_cond_list = cympy.study.ListDevices(cympy.enums.DeviceType.OverheadLine, ckt_name)
-    oh_phase_cond_list = cympy.study.ListDevices(cympy.enums.DeviceType.OverheadByPhase, ckt_name)
-    oh_unbalanced_cond_list = cympy.study.ListDevices(cympy.enums.DeviceType.OverheadLineUnbalanced, ckt_name)
-    ug_cable_list = cympy.study.ListDevices(cympy.enums.DeviceType.Underground, ckt_name)
-
-    # Iterate through all overhead lines,
-    # add to dictionary, remove if section has other conductor (in dictionary) or not default
-    for oh_cond in oh_cond_list:
-        if oh_cond.SectionID not in cond_dict:
-            cond_dict[oh_cond.SectionID] = oh_cond
-            if check_default_cond(oh_cond.GetValue('LineID'), cond_defaults):
-                oh_default_list.append(oh_cond)
-    # Iterate through all overhead lines by phase,
-    # add to dictionary, remove if section has other conductor (in dictionary) or not default
-    for oh_phase_cond in oh_phase_cond_list:
-        if oh_phase_cond.SectionID not in cond_dict:
-            cond_dict[oh_phase_cond.SectionID] = oh_phase_cond
-            if check_default_cond(oh_phase_cond.GetValue('PhaseConductorIDA'), cond_defaults) or \
-                    check_default_cond(oh_phase_cond.GetValue('PhaseConductorIDB'), cond_defaults) or \
-                    check_default_cond(oh_phase_cond.GetValue('PhaseConductorIDC'), cond_defaults) or \
-                    check_default_cond(oh_phase_cond.GetValue('NeutralConductorID1'), cond_defaults) or \
-                    check_default_cond(oh_phase_cond.GetValue('NeutralConductorID2'), cond_defaults):
-                oh_phase_default_list.append(oh_phase_cond)
-    # Iterate through all overhead lines unbalanced,
-    # add to dictionary, remove if section has other conductor (in dictionary) or not default
-    for oh_unbalanced_cond in oh_unbalanced_cond_list:
-        if oh_unbalanced_cond.SectionID not in cond_dict:
-            cond_dict[oh_unbalanced_cond.SectionID] = oh_unbalanced_cond
-            if check_default_cond(oh_unbalanced_cond.GetValue('LineID'), cond_defaults):
-                oh_unbalanced_default_list.append(oh_unbalanced_cond)
-    # Iterate through all underground cables,
-    # add to dictionary, remove if section has other conductor (in dictionary) or not default
-    for ug_cable in ug_cable_list:
-        if ug_cable.SectionID not in cond_dict:
-            cond_dict[ug_cable.SectionID] = ug_cable
-            if check_default_cond(ug_cable.GetValue('CableID'), cond_defaults):
-                ug_cable_default_list.append(ug_cable)
-
-    return cond_dict, oh_default_list + oh_unbalanced_default_list, oh_phase_default_list, ug_cable_default_list
-
-
-def get_cond(old_cond, up_dw, conductor_dict, line_id_names, depth_max, kva_diff_max, default_cond_ids):
+    :param conductors: Dictionary of device type to conductor devices of circuit from list_conductor_devices,
+    None to list devices
+    :return: Conductor table
+    """
+    # Initialize conductor table
+    Instrumentation.mark('load')
+    cond_table = {'SECTIONID': [], 'DEVICETYPE': [], 'DEVICENUMBER': [], 'DEFAULT': array('B'), 'ROW': {}}
+    for line_id_name in LINE_ID_NAMES:
+        cond_table[line_id_name] = []
+
+    # Iterate through all overhead lines, overhead lines by phase, overhead lines unbalanced, underground cables,
+    # add to table if section doesn't have other conductor (in table), read every line ID once
+    if conductors is None:
+        conductors = list_conductor_devices(ckt_name)
+    for device_type, devices in conductors.items():
+        line_id_names = LINE_ID_FIELDS[device_type]
+        for cond in devices:
+            if cond.SectionID not in cond_table['ROW']:
+                cond_table['ROW'][cond.SectionID] = len(cond_table['SECTIONID'])
+                cond_table['SECTIONID'].append(cond.SectionID)
+                cond_table['DEVICETYPE'].append(cond.DeviceType)
+                cond_table['DEVICENUMBER'].append(cond.DeviceNumber)
+                for line_id_name in LINE_ID_NAMES:
+                    if line_id_name in line_id_names:
+                        cond_table[line_id_name].append(cond.GetValue(line_id_name))
+                    else:
+                        cond_table[line_id_name].append(None)
+
+    return cond_table
+
+
+def list_conductor_devices(ckt_name):
+    """
+    Lists conductor devices of circuit (line IDs not read)
+    :param ckt_name: String of circuit name
+    :return: Dictionary of device type to list of devices (overhead lines, overhead lines by phase, overhead lines
+    unbalanced, underground cables, in that order)
+    """
+    return collections.OrderedDict((device_type, cympy.study.ListDevices(device_type, ckt_name))
+                                   for device_type in (cympy.enums.DeviceType.OverheadLine,
+                                                       cympy.enums.DeviceType.OverheadByPhase,
+                                                       cympy.enums.DeviceType.OverheadLineUnbalanced,
+                                                       cympy.enums.DeviceType.Underground))
+
+
+def classify_conductors(cond_table, cond_defaults):
+    """
+    Sets DEFAULT bitmask of conductor table
+    :param cond_table: Conductor table from list_conductors
+    :param cond_defaults: List of default conductor IDs or DefaultMatcher
+    :return: List of rows of OH and OH unbalanced default conductors, list of rows of OH by phase default conductors,
+    list of rows of UG default cables
+    """
+    # Classify each line ID column at once, set default bit of line IDs that are default
+    Instrumentation.mark('classify')
+    matcher = cond_defaults if isinstance(cond_defaults, DefaultMatcher) else DefaultMatcher(cond_defaults)
+    cond_table['DEFAULT'] = array('B', [0]) * len(cond_table['SECTIONID'])
+    for line_id_name in LINE_ID_NAMES:
+        for row, default_bool in enumerate(matcher.classify(cond_table[line_id_name])):
+            if default_bool:
+                cond_table['DEFAULT'][row] |= LINE_ID_BITS[line_id_name]
+
+    # Add rows with any default line ID to default list of device type
+    default_lists = {device_type: [] for device_type in LINE_ID_FIELDS}
+    for row, default_mask in enumerate(cond_table['DEFAULT']):
+        if default_mask:
+            default_lists[cond_table['DEVICETYPE'][row]].append(row)
+
+    return default_lists[cympy.enums.DeviceType.OverheadLine] + \
+        default_lists[cympy.enums.DeviceType.OverheadLineUnbalanced], \
+        default_lists[cympy.enums.DeviceType.OverheadByPhase], \
+        default_lists[cympy.enums.DeviceType.Underground]
+
+
+def set_line_id(cond_table, row, line_id_name, line_id, default_ids, plan=None):
+    """
+    Sets line ID of conductor in conductor table (keeps default bitmask up to date),
+    and in Cyme or (if plan given) in plan
+    :param cond_table: Conductor table from get_conductors
+    :param row: Row of conductor in table
+    :param line_id_name: Line ID field name
+    :param line_id: New line ID string
+    :param default_ids: Default conductor IDs list or DefaultMatcher
+    :param plan: List of ConductorChange to append change to, None to write to Cyme
+    :return: None
+    """
+    if plan is None:
+        cympy.study.SetValueDevice(line_id, line_id_name, cond_table['DEVICENUMBER'][row],
+                                   cond_table['DEVICETYPE'][row])
+    else:
+        plan.append(ConductorChange(cond_table['SECTIONID'][row], line_id_name, cond_table[line_id_name][row],
+                                    line_id))
+    cond_table[line_id_name][row] = line_id
+    if check_default_cond(line_id, default_ids):
+        cond_table['DEFAULT'][row] |= LINE_ID_BITS[line_id_name]
+    else:
+        cond_table['DEFAULT'][row] &= ~LINE_ID_BITS[line_id_name] & 0xFF
+
+
+def get_topology(ckt_name, sections=None):
+    """
+    Builds in-memory topology snapshot of circuit (array-backed parent/children index over sections)
+    Children are stored in compressed form: children of section i are CHILDREN[CHILDSTART[i]:CHILDSTART[i + 1]]
+    :param ckt_name: String of circuit name
+    :param sections: List of sections of circuit if already listed, None to list sections
+    :return: Dictionary with keys SECTIONS (section IDs), INDEX (section ID to position), FROMNODE, TONODE,
+    PARENT (parent position, -1 if none), CHILDSTART, CHILDREN
+    """
+    # Get every section of circuit once
+    if sections is None:
+        sections = cympy.study.ListSections(ckt_name)
+
+    # Initialize section ID, node lists and section index
+    sect_ids = []
+    from_nodes = []
+    to_nodes = []
+    sect_index = {}
+    for sect in sections:
+        sect_index[sect.ID] = len(sect_ids)
+        sect_ids.append(sect.ID)
+        from_nodes.append(sect.FromNode.ID)
+        to_nodes.append(sect.ToNode.ID)
+
+    # Map to node to section ending at node (radial, one section per to node)
+    to_node_sect = {}
+    for sect_pos, to_node in enumerate(to_nodes):
+        to_node_sect[to_node] = sect_pos
+
+    # Parent is section ending at from node of section, count children of each parent
+    parents = array('l', [-1]) * len(sect_ids)
+    child_count = array('l', [0]) * (len(sect_ids) + 1)
+    for sect_pos, from_node in enumerate(from_nodes):
+        parent = to_node_sect.get(from_node, -1)
+        parents[sect_pos] = parent
+        if parent != -1:
+            child_count[parent + 1] += 1
+
+    # Prefix sum of child counts gives start of children of each section
+    for sect_pos in range(len(sect_ids)):
+        child_count[sect_pos + 1] += child_count[sect_pos]
+    child_start = child_count
+    children = array('l', [0]) * child_start[-1]
+    next_child = array('l', child_start)
+    for sect_pos, parent in enumerate(parents):
+        if parent != -1:
+            children[next_child[parent]] = sect_pos
+            next_child[parent] += 1
+
+    return {'SECTIONS': sect_ids, 'INDEX': sect_index, 'FROMNODE': from_nodes, 'TONODE': to_nodes,
+            'PARENT': parents, 'CHILDSTART': child_start, 'CHILDREN': children}
+
+
+def walk_topology(topology, sect_pos, up_dw, depth_max):
+    """
+    Walks topology snapshot upstream/downstream of section, same order and depth as Cyme network iterator
+    (upstream: parent chain, downstream: depth first), sections deeper than depth_max are not visited
+    :param topology: Topology dictionary from get_topology
+    :param sect_pos: Position of starting section in topology
+    :param up_dw: Up or down string
+    :param depth_max: Max depth of walk
+    :return: Generator of (section position, depth) tuples
+    """
+    parents = topology['PARENT']
+    if up_dw == 'UP':
+        depth = 1
+        parent = parents[sect_pos]
+        while parent != -1 and depth <= depth_max:
+            yield parent, depth
+            depth += 1
+            parent = parents[parent]
+    else:
+        child_start = topology['CHILDSTART']
+        children = topology['CHILDREN']
+        # Stack of (section position, depth), children pushed in reverse to keep iterator order
+        stack = []
+        if depth_max >= 1:
+            stack = [(children[pos], 1) for pos in range(child_start[sect_pos + 1] - 1, child_start[sect_pos] - 1, -1)]
+        while stack:
+            pos, depth = stack.pop()
+            yield pos, depth
+            # Children of sections at max depth are too deep, don't visit subtree
+            if depth < depth_max:
+                for child in range(child_start[pos + 1] - 1, child_start[pos] - 1, -1):
+                    stack.append((children[child], depth + 1))
+
+
+def get_neighbourhood(topology, sect_pos, depth_max):
+    """
+    Gets sections within depth_max sections upstream/downstream of section
+    (sections whose get_cond search can reach section and sections section's search can reach)
+    :param topology: Topology dictionary from get_topology
+    :param sect_pos: Position of section in topology
+    :param depth_max: Max depth
+    :return: Set of section positions
+    """
+    neighbourhood = set()
+    for up_dw in ('UP', 'DOWN'):
+        for it_pos, it_depth in walk_topology(topology, sect_pos, up_dw, depth_max):
+            neighbourhood.add(it_pos)
+
+    return neighbourhood
+
+
+class KVACache(object):
+    """
+    Per-run downstream kVA (DwKVAT) cache, float array indexed by topology section position
+    Modes: 'QUERY' queries DwKVAT of every conductor in one sweep,
+    'ACCUMULATE' sums load kVA of every section bottom-up over topology (one query per load instead of per section)
+    """
+
+    def __init__(self, topology, cond_table, mode='QUERY'):
+        """
+        Fills kVA cache
+        :param topology: Topology dictionary from get_topology
+        :param cond_table: Conductor table from get_conductors
+        :param mode: 'QUERY' or 'ACCUMULATE'
+        """
+        self.kva = array('d', [math.nan]) * len(topology['SECTIONS'])
+        self.hits = 0
+        self.misses = 0
+
+        if mode == 'QUERY':
+            # Query downstream kVA of every conductor once
+            for sect_id, row in cond_table['ROW'].items():
+                if sect_id in topology['INDEX']:
+                    self.kva[topology['INDEX'][sect_id]] = \
+                        float(cympy.study.QueryInfoDevice('DwKVAT', cond_table['DEVICENUMBER'][row],
+                                                          cond_table['DEVICETYPE'][row]))
+        elif mode == 'ACCUMULATE':
+            self.accumulate(topology)
+        else:
+            raise ValueError('Unknown kVA cache mode: ' + str(mode))
+
+    def accumulate(self, topology):
+        """
+        Computes downstream kVA of every section with one bottom-up accumulation of load kVA over topology
+        (arithmetic sum of load kVA, losses not included)
+        :param topology: Topology dictionary from get_topology
+        :return: None
+        """
+        # Sum kVA of loads on each section
+        for load_type in (cympy.enums.DeviceType.SpotLoad, cympy.enums.DeviceType.DistributedLoad):
+            for load in cympy.study.ListDevices(load_type):
+                if load.SectionID in topology['INDEX']:
+                    sect_pos = topology['INDEX'][load.SectionID]
+                    load_kva = float(cympy.study.QueryInfoDevice('KVAT', load.DeviceNumber, load.DeviceType))
+                    if math.isnan(self.kva[sect_pos]):
+                        self.kva[sect_pos] = load_kva
+                    else:
+                        self.kva[sect_pos] += load_kva
+        for sect_pos, sect_kva in enumerate(self.kva):
+            if math.isnan(sect_kva):
+                self.kva[sect_pos] = 0.0
+
+        # Order sections top-down (parents before children) starting from sections without parent
+        order = [sect_pos for sect_pos, parent in enumerate(topology['PARENT']) if parent == -1]
+        child_start = topology['CHILDSTART']
+        children = topology['CHILDREN']
+        for sect_pos in order:
+            order.extend(children[child_start[sect_pos]:child_start[sect_pos + 1]])
+
+        # Add kVA of each section to its parent, children first
+        parents = topology['PARENT']
+        for sect_pos in reversed(order):
+            if parents[sect_pos] != -1:
+                self.kva[parents[sect_pos]] += self.kva[sect_pos]
+
+    def get(self, sect_pos, device_number, device_type):
+        """
+        Gets downstream kVA of section, queries Cyme (and stores) if section not in cache
+        :param sect_pos: Position of section in topology
+        :param device_number: Device number of conductor on section
+        :param device_type: Device type of conductor on section
+        :return: Downstream kVA float
+        """
+        sect_kva = self.kva[sect_pos]
+        if math.isnan(sect_kva):
+            self.misses += 1
+            sect_kva = float(cympy.study.QueryInfoDevice('DwKVAT', device_number, device_type))
+            self.kva[sect_pos] = sect_kva
+        else:
+            self.hits += 1
+
+        return sect_kva
+
+    def hit_rate(self):
+        """
+        Gets fraction of lookups answered from cache
+        :return: Hit rate float (0 if no lookups)
+        """
+        if self.hits + self.misses == 0:
+            return 0.0
+        return self.hits / (self.hits + self.misses)
+
+
+def get_cache_arrays(topology):
+    """
+    Gets arrays of topology to write to feeder cache
+    :param topology: Topology dictionary from get_topology
+    :return: Dictionary of array name to list of strings or array
+    """
+    return {'SECTIONS': topology['SECTIONS'], 'FROMNODE': topology['FROMNODE'], 'TONODE': topology['TONODE'],
+            'PARENT': topology['PARENT'], 'CHILDSTART': topology['CHILDSTART'], 'CHILDREN': topology['CHILDREN']}
+
+
+def read_cache_arrays(arrays):
+    """
+    Rebuilds topology from feeder cache arrays
+    :param arrays: Dictionary of array name to array from FeederCache.load
+    :return: Topology dictionary
+    """
+    sect_ids = arrays['SECTIONS'].tolist()
+    return {'SECTIONS': sect_ids, 'INDEX': {sect_id: sect_pos for sect_pos, sect_id in enumerate(sect_ids)},
+            'FROMNODE': arrays['FROMNODE'].tolist(), 'TONODE': arrays['TONODE'].tolist(),
+            'PARENT': array('l', arrays['PARENT'].tolist()),
+            'CHILDSTART': array('l', arrays['CHILDSTART'].tolist()),
+            'CHILDREN': array('l', arrays['CHILDREN'].tolist())}
+
+
+def get_ckt_data(ckt, default_matcher, kva_mode='QUERY', cache_dir=None, refresh_cache=False):
+    """
+    Gets conductor table, topology and kVA cache of circuit
+    Conductors (line IDs) and downstream kVA are always read from Cyme, as edits to them don't change sections.
+    Topology is read from feeder cache (memory-mapped arrays) if cache directory given and fingerprint of circuit
+    (section count and checksum of section IDs and their from/to nodes) unchanged, else built from Cyme (written to
+    cache if cache directory given)
+    :param ckt: String of circuit name
+    :param default_matcher: DefaultMatcher
+    :param kva_mode: KVACache mode ('QUERY' or 'ACCUMULATE')
+    :param cache_dir: Feeder cache directory, None to not use cache
+    :param refresh_cache: Bool to build topology from Cyme and rewrite cache even if cache is valid
+    :return: Conductor table, list of rows of OH and OH unbalanced default conductors,
+    list of rows of OH by phase default conductors, list of rows of UG default cables, topology, kVA cache
+    """
+    conductor_table = list_conductors(ckt)
+    Instrumentation.mark('load')
+    if cache_dir is None:
+        topology = get_topology(ckt)
+    else:
+        # Map cached topology if sections of circuit unchanged
+        sections = cympy.study.ListSections(ckt)
+        fingerprint = FeederCache.fingerprint(['{}:{}:{}'.format(sect.ID, sect.FromNode.ID, sect.ToNode.ID)
+                                               for sect in sections])
+        arrays = None if refresh_cache else FeederCache.load(cache_dir, ckt, fingerprint)
+        if arrays is not None:
+            topology = read_cache_arrays(arrays)
+        else:
+            topology = get_topology(ckt, sections)
+            FeederCache.save(cache_dir, ckt, fingerprint, get_cache_arrays(topology))
+    kva_cache = KVACache(topology, conductor_table, kva_mode)
+
+    return (conductor_table,) + classify_conductors(conductor_table, default_matcher) + (topology, kva_cache)
+
+
+def get_cond(old_row, up_dw, cond_table, line_id_names, depth_max, kva_diff_max, topology, kva_cache):
     """
     Looks for upstream/downstream conductor, if conductor within kVA difference max
-    :param old_cond: Default conductor object
+    :param old_row: Default conductor row in conductor table
     :param up_dw: Up or down string
-    :param conductor_dict: Conductor dictionary with section ID as key, conductor as object
+    :param cond_table: Conductor table from get_conductors
     :param line_id_names: conductor type get value list of strings
         ('LineID'/'PhaseConductorIDA'/'PhaseConductorIDB'/'PhaseConductorIDC'/'CableID')
     :param depth_max: Max depth before breaking (how far upstream does script check)
     :param kva_diff_max: kVA difference that want to stay between
-    :param default_cond_ids: default conductor IDs list
+    :param topology: Topology dictionary from get_topology
+    :param kva_cache: KVACache of downstream kVA
     :return: Upstream/downstream conductor string and boolean with if upstream conductor within kVA difference max
     """
-    # Get section, downstream kVA of default conductor
-    sect = cympy.study.GetSection(old_cond.SectionID)
-    sect_dw_kva = float(cympy.study.QueryInfoDevice('DwKVAT', old_cond.DeviceNumber, old_cond.DeviceType))
+    # Get section position, downstream kVA of default conductor
+    old_type = cond_table['DEVICETYPE'][old_row]
+    sect_pos = topology['INDEX'][cond_table['SECTIONID'][old_row]]
+    sect_dw_kva = kva_cache.get(sect_pos, cond_table['DEVICENUMBER'][old_row], old_type)
 
     # Initialize new conductor dictionary, bool if within kVA
     new_cond = {}
@@ -98,40 +500,24 @@ def get_cond(old_cond, up_dw, conductor_dict, line_id_names, depth_max, kva_diff
         new_cond[line_id_name] = 'N/A'
     in_kva = False
 
-    # Create iterator
-    if up_dw == 'UP':
-        it = cympy.study.NetworkIterator(sect.FromNode.ID, cympy.enums.IterationOption.Upstream)
-    else:
-        it = cympy.study.NetworkIterator(sect.ToNode.ID, cympy.enums.IterationOption.Downstream)
-
-    # Iterate upstream/downstream
-    while it.Next():
-        # If section is default section then increment max depth (don't count default section) and continue
-        if it.GetSection() == sect:
-            depth_max += 1
-            continue
-
-        # Check if more than depth_max sections upstream/downstream,
-        # If so then exit (if going up) or continue (if going down)
-        if it.GetDepth() > depth_max:
-            if up_dw == 'UP':
-                break
-            else:
-                continue
+    # Walk topology upstream/downstream (sections more than depth_max sections away are not visited,
+    # default section itself is never visited)
+    for it_pos, it_depth in walk_topology(topology, sect_pos, up_dw, depth_max):
+        it_sect_id = topology['SECTIONS'][it_pos]
 
         in_kva = False
 
-        # Check if section in conductor dictionary
-        if it.GetSection().ID in conductor_dict:
+        # Check if section in conductor table
+        if it_sect_id in cond_table['ROW']:
+            it_row = cond_table['ROW'][it_sect_id]
             # If conductor type is different than default conductor then break
-            if conductor_dict[it.GetSection().ID].DeviceType != old_cond.DeviceType:
+            if cond_table['DEVICETYPE'][it_row] != old_type:
                 break
 
             # Check if downstream kVA within kva_diff_max
             if (sect_dw_kva != 0) and \
-                    (abs(float(cympy.study.QueryInfoDevice('DwKVAT', conductor_dict[it.GetSection().ID].DeviceNumber,
-                                                           conductor_dict[it.GetSection().ID].DeviceType)) -
-                         sect_dw_kva) / sect_dw_kva < kva_diff_max):
+                    (abs(kva_cache.get(it_pos, cond_table['DEVICENUMBER'][it_row], old_type) - sect_dw_kva) /
+                     sect_dw_kva < kva_diff_max):
                 in_kva = True
 
             # Loop through line IDs
@@ -140,15 +526,16 @@ def get_cond(old_cond, up_dw, conductor_dict, line_id_names, depth_max, kva_diff
             good_line_ids = []
             for line_id_name in line_id_names:
                 # If iterator conductor is not default, then try to get conductor, else continue
-                if not check_default_cond(conductor_dict[it.GetSection().ID].GetValue(line_id_name), default_cond_ids):
+                it_line_id = cond_table[line_id_name][it_row]
+                if not cond_table['DEFAULT'][it_row] & LINE_ID_BITS[line_id_name]:
                     # If not set then set upstream/downstream conductor
                     if sect_conductors[line_id_name] == 'N/A':
-                        sect_conductors[line_id_name] = conductor_dict[it.GetSection().ID].GetValue(line_id_name)
+                        sect_conductors[line_id_name] = it_line_id
                     # Else if set but same as before then no action
-                    elif sect_conductors[line_id_name] == conductor_dict[it.GetSection().ID].GetValue(line_id_name):
+                    elif sect_conductors[line_id_name] == it_line_id:
                         pass
                     # Else if different than conductor before then set equal to 'CA' (can't assign)
-                    elif sect_conductors[line_id_name] != conductor_dict[it.GetSection().ID].GetValue(line_id_name):
+                    elif sect_conductors[line_id_name] != it_line_id:
                         sect_conductors[line_id_name] = 'CA'
 
                     # If got conductor and within kVA range, or 'CA' then mark line ID as good (append 0),
@@ -179,188 +566,765 @@ def get_cond(old_cond, up_dw, conductor_dict, line_id_names, depth_max, kva_diff
     return new_cond, in_kva
 
 
-def assign_cond(assign_conductor, line_type_ids, cond_dictionary, changed_dict, ir_dict,
-                it_depth_max, kva_pct_max, default_list):
+def assign_cond(assign_row, line_type_ids, cond_table, changed_dict, ir_dict,
+                it_depth_max, kva_pct_max, default_list, topology, kva_cache, plan=None):
     """
     Assigns conductor IDs
-    :param assign_conductor: conductor object
+    :param assign_row: conductor row in conductor table
     :param line_type_ids: line type ID string
-    :param cond_dictionary: conductor dictionary
+    :param cond_table: conductor table
     :param changed_dict: changed dictionary
     :param ir_dict: input required dictionary
     :param it_depth_max: max iterations upstream/downstream
     :param kva_pct_max: max percent difference in kVA
-    :param default_list: default conductor list
+    :param default_list: default conductor list or DefaultMatcher
+    :param topology: topology dictionary
+    :param kva_cache: downstream kVA cache
+    :param plan: list of ConductorChange to plan changes in, None to write changes to Cyme
     :return: changed dictionary, input required dictionary
     """
     # Get upstream conductor, within kVA bool
-    up_cond, up_kva = get_cond(assign_conductor, 'UP', cond_dictionary, line_type_ids,
-                               it_depth_max, kva_pct_max, default_list)
+    up_cond, up_kva = get_cond(assign_row, 'UP', cond_table, line_type_ids,
+                               it_depth_max, kva_pct_max, topology, kva_cache)
 
     # Get downstream conductor, within kVA bool
-    down_cond, down_kva = get_cond(assign_conductor, 'DOWN', cond_dictionary, line_type_ids,
-                                   it_depth_max, kva_pct_max, default_list)
+    down_cond, down_kva = get_cond(assign_row, 'DOWN', cond_table, line_type_ids,
+                                   it_depth_max, kva_pct_max, topology, kva_cache)
+
+    section_id = cond_table['SECTIONID'][assign_row]
 
     for line_type_id in line_type_ids:
-        # Initialize output dictionary
-        changed_cond_dict = {'SECTION': '', 'OLD': '', 'NEW': '', 'LINEID': line_type_id}
-        ir_cond_dict = {'SECTION': '', 'UPSTREAM': '', 'DOWNSTREAM': '', 'LINEID': line_type_id,
-                        'COND': assign_conductor}
+        # Results keyed by section ID and line ID field
+        result_key = (section_id, line_type_id)
 
         # If upstream conductor is not 'CA' but downstream is 'CA', use upstream
         if (up_cond[line_type_id] != 'CA') and (down_cond[line_type_id] == 'CA'):
-            changed_cond_dict['SECTION'] = assign_conductor.SectionID
-            changed_cond_dict['OLD'] = assign_conductor.GetValue(line_type_id)
-            changed_cond_dict['NEW'] = up_cond[line_type_id]
-            changed_dict[str(assign_conductor.SectionID) + ', ' + str(line_type_id)] = changed_cond_dict.copy()
-            assign_conductor.SetValue(up_cond[line_type_id], line_type_id)
+            new_line_id = up_cond[line_type_id]
 
         # Else if upstream conductor is 'CA' but downstream is not 'CA', use downstream
         elif (up_cond[line_type_id] == 'CA') and (down_cond[line_type_id] != 'CA'):
-            changed_cond_dict['SECTION'] = assign_conductor.SectionID
-            changed_cond_dict['OLD'] = assign_conductor.GetValue(line_type_id)
-            changed_cond_dict['NEW'] = down_cond[line_type_id]
-            changed_dict[str(assign_conductor.SectionID) + ', ' + str(line_type_id)] = changed_cond_dict.copy()
-            assign_conductor.SetValue(down_cond[line_type_id], line_type_id)
+            new_line_id = down_cond[line_type_id]
 
         # Else if both are 'CA' then input required
         elif (up_cond[line_type_id] == 'CA') and (down_cond[line_type_id] == 'CA'):
-            ir_cond_dict['SECTION'] = assign_conductor.SectionID
-            ir_cond_dict['UPSTREAM'] = up_cond[line_type_id]
-            ir_cond_dict['DOWNSTREAM'] = down_cond[line_type_id]
-            ir_dict[str(assign_conductor.SectionID) + ', ' + str(line_type_id)] = ir_cond_dict.copy()
+            ir_dict[result_key] = InputRequiredConductor(section_id, up_cond[line_type_id], down_cond[line_type_id],
+                                                         line_type_id, assign_row)
+            continue
 
         # Else if both are not 'CA'
         else:
             # If both same, then use downstream
             if up_cond[line_type_id] == down_cond[line_type_id]:
-                changed_cond_dict['SECTION'] = assign_conductor.SectionID
-                changed_cond_dict['OLD'] = assign_conductor.GetValue(line_type_id)
-                changed_cond_dict['NEW'] = down_cond[line_type_id]
-                changed_dict[str(assign_conductor.SectionID) + ', ' + str(line_type_id)] = changed_cond_dict.copy()
-                assign_conductor.SetValue(down_cond[line_type_id], line_type_id)
+                new_line_id = down_cond[line_type_id]
             # Else (upstream, downstream different)
             else:
                 # If upstream within kVA and downstream not within kVA then, use upstream
                 if up_kva and not down_kva:
-                    changed_cond_dict['SECTION'] = assign_conductor.SectionID
-                    changed_cond_dict['OLD'] = assign_conductor.GetValue(line_type_id)
-                    changed_cond_dict['NEW'] = up_cond[line_type_id]
-                    changed_dict[str(assign_conductor.SectionID) + ', ' + str(line_type_id)] = changed_cond_dict.copy()
-                    assign_conductor.SetValue(up_cond[line_type_id], line_type_id)
+                    new_line_id = up_cond[line_type_id]
                 # Else if upstream not within kVA and downstream within kVA, then use downstream
                 elif not up_kva and down_kva:
-                    changed_cond_dict['SECTION'] = assign_conductor.SectionID
-                    changed_cond_dict['OLD'] = assign_conductor.GetValue(line_type_id)
-                    changed_cond_dict['NEW'] = down_cond[line_type_id]
-                    changed_dict[str(assign_conductor.SectionID) + ', ' + str(line_type_id)] = changed_cond_dict.copy()
-                    assign_conductor.SetValue(down_cond[line_type_id], line_type_id)
+                    new_line_id = down_cond[line_type_id]
                 # Else, then use downstream
                 else:
-                    changed_cond_dict['SECTION'] = assign_conductor.SectionID
-                    changed_cond_dict['OLD'] = assign_conductor.GetValue(line_type_id)
-                    changed_cond_dict['NEW'] = down_cond[line_type_id]
-                    changed_dict[str(assign_conductor.SectionID) + ', ' + str(line_type_id)] = changed_cond_dict.copy()
-                    assign_conductor.SetValue(down_cond[line_type_id], line_type_id)
+                    new_line_id = down_cond[line_type_id]
+
+        # Record change (old line ID read before setting), set line ID
+        changed_dict[result_key] = ChangedConductor(section_id, cond_table[line_type_id][assign_row], new_line_id,
+                                                    line_type_id)
+        set_line_id(cond_table, assign_row, line_type_id, new_line_id, default_list, plan)
 
     return changed_dict, ir_dict
 
 
-def cyme_report(output_dict, title, headers):
+def cyme_report(output_dict, title, headers, max_rows=None, summary=False):
     """
     Creates Cyme report
-    :param output_dict: dictionary of dictionaries to report
+    :param output_dict: dictionary of records to report
     :param title: string of report title
-    :param headers: list of strings for header
+    :param headers: list of strings for header (record fields)
+    :param max_rows: max number of rows to show (last row counts rows not shown), None to show every row
+    :param summary: bool to show one row per distinct value of headers other than SECTION, with COUNT of records,
+    instead of one row per record
     :return: None
     """
+    # Get values of each row, counts of distinct values (most common first) if summary
+    if summary:
+        headers = [header for header in headers if header != 'SECTION']
+        counts = collections.Counter(tuple(getattr(output_line, header) for header in headers)
+                                     for output_line in output_dict.values())
+        rows = [values + (str(count),) for values, count in counts.most_common()]
+        headers = headers + ['COUNT']
+    else:
+        rows = [tuple(getattr(output_line, header) for header in headers) for output_line in output_dict.values()]
+
     # Create Cyme report
     report = cympy.rm.CustomReport(title, headers)
 
-    # Iterate through output dictionary
-    for output_key, output_line in output_dict.items():
+    # Iterate through rows (up to max rows)
+    for cyme_values in rows[:max_rows]:
         cyme_row = []
-        for header in headers:
+        for header, value in zip(headers, cyme_values):
             if header == 'SECTION':
-                cyme_row.append(cympy.rm.SectionCell(output_line[header]))
+                cyme_row.append(cympy.rm.SectionCell(value))
             else:
-                cyme_row.append(cympy.rm.StringCell(output_line[header]))
+                cyme_row.append(cympy.rm.StringCell(value))
         # Add row to output report
         report.AddRow(cyme_row)
+    if max_rows is not None and len(rows) > max_rows:
+        report.AddRow([cympy.rm.StringCell('{} more rows not shown'.format(len(rows) - max_rows))] +
+                      [cympy.rm.StringCell('') for header in headers[1:]])
 
     # Display report
     report.Show()
 
 
-def fix_cond():
+def export_records(output_dict, export_file, fields):
+    """
+    Writes records to CSV file, or to Parquet file if file name ends with .parquet (needs pandas, pyarrow)
+    :param output_dict: dictionary of records
+    :param export_file: CSV or Parquet file path
+    :param fields: list of record fields to write (columns)
+    :return: Number of records written
+    """
+    if export_file.lower().endswith('.parquet'):
+        import pandas as pd
 
-    #################################################################################################
-    # Assumptions
-    max_depth = 3
-    max_kva_diff = 0.1
-    default_id_list = ['DEFAULT', 'N/A']
-    #################################################################################################
+        records = [tuple(getattr(record, field) for field in fields) for record in output_dict.values()]
+        pd.DataFrame.from_records(records, columns=fields).to_parquet(export_file, index=False)
+    else:
+        with open(export_file, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(fields)
+            writer.writerows(tuple(getattr(record, field) for field in fields) for record in output_dict.values())
 
-    # Check for multiple circuits, else set circuit name
-    if len(cympy.study.ListNetworks()) > 1:
-        raise ValueError('Found more than one circuit')
-    elif len(cympy.study.ListNetworks()) == 0:
-        raise ValueError('No circuit loaded')
+    return len(output_dict)
+
+
+def insert_records(con, cur, table_name, output_dict, fields, batch_size=1000):
+    """
+    Inserts records into Oracle table (columns named as fields) in batches, committed as one transaction
+    :param con: Oracle connection
+    :param cur: Oracle cursor
+    :param table_name: String of table name
+    :param output_dict: dictionary of records
+    :param fields: list of record fields to insert (columns)
+    :param batch_size: Number of rows per batch
+    :return: Number of rows inserted
+    """
+    records = [tuple(getattr(record, field) for field in fields) for record in output_dict.values()]
+
+    # Insert rows in batches, one commit (roll back every batch if one fails)
+    cur.prepare('INSERT INTO ' + table_name + ' (' + ', '.join(fields) + ') VALUES (' +
+                ', '.join(':' + str(col + 1) for col in range(len(fields))) + ')')
+    try:
+        for start in range(0, len(records), batch_size):
+            cur.executemany(None, records[start:start + batch_size])
+    except Exception:
+        con.rollback()
+        raise
+    con.commit()
+
+    return len(records)
+
+
+def retry_cond_fixpoint(ir_dict, changed_dict, cond_table, max_depth, max_kva_diff, default_matcher,
+                        topology, kva_cache, plan=None):
+    """
+    Retries input required conductors until nothing changes, first wave retries every conductor (same as single
+    retry, retry only searches conductor's own line ID), later waves only retry conductors within max_depth of a
+    section reassigned in previous wave
+    :param ir_dict: input required dictionary
+    :param changed_dict: changed dictionary
+    :param cond_table: conductor table
+    :param max_depth: max sections upstream/downstream
+    :param max_kva_diff: max percent difference in kVA
+    :param default_matcher: default conductor list or DefaultMatcher
+    :param topology: topology dictionary
+    :param kva_cache: downstream kVA cache
+    :param plan: list of ConductorChange to plan changes in, None to write changes to Cyme
+    :return: changed dictionary, input required dictionary (unresolved), number of waves
+    """
+    unresolved_dict = dict(ir_dict)
+    queue = list(unresolved_dict)
+    waves = 0
+
+    while queue:
+        # Retry queued conductors, keep those still input required
+        waves += 1
+        reassigned = set()
+        for ir_key in queue:
+            ir_cond = unresolved_dict.pop(ir_key)
+            wave_dict = {}
+            changed_dict, wave_dict = \
+                assign_cond(ir_cond.ROW, [ir_cond.LINEID], cond_table, changed_dict, wave_dict,
+                            max_depth, max_kva_diff, default_matcher, topology, kva_cache, plan)
+            if ir_key in wave_dict:
+                unresolved_dict[ir_key] = wave_dict[ir_key]
+            else:
+                reassigned.add(topology['INDEX'][ir_cond.SECTION])
+
+        # Get sections affected by reassigned sections, queue unresolved conductors on them
+        affected = set()
+        for sect_pos in reassigned:
+            affected |= get_neighbourhood(topology, sect_pos, max_depth)
+        queue = [ir_key for ir_key, ir_cond in unresolved_dict.items()
+                 if topology['INDEX'][ir_cond.SECTION] in affected]
+
+    return changed_dict, unresolved_dict, waves
+
+
+def apply_plan(plan, cond_table):
+    """
+    Writes planned changes to Cyme, grouped in one batch per device (last value of each field),
+    rolls back written changes if Cyme error
+    Field is only written if its value in Cyme is still the value plan was made from, fields edited since
+    conductors were read (e.g. by hand while run was planning) are skipped
+    :param plan: List of ConductorChange
+    :param cond_table: Conductor table plan was made from
+    :return: Number of devices written, list of ConductorChange of skipped fields (OLD is value in Cyme)
+    """
+    # Group changes by device, keep original (first old) and final (last new) value of each field
+    device_changes = collections.OrderedDict()
+    for change in plan:
+        field_changes = device_changes.setdefault(change.SECTION, collections.OrderedDict())
+        if change.FIELD in field_changes:
+            field_changes[change.FIELD] = (field_changes[change.FIELD][0], change.NEW)
+        else:
+            field_changes[change.FIELD] = (change.OLD, change.NEW)
+
+    # Write each device's fields still at planned old value, undo written fields (newest first) if any write fails
+    written = []
+    skipped = []
+    devices = 0
+    try:
+        for sect_id, field_changes in device_changes.items():
+            row = cond_table['ROW'][sect_id]
+            device = cympy.study.GetDevice(cond_table['DEVICENUMBER'][row], cond_table['DEVICETYPE'][row])
+            device_written = False
+            for field, (old_id, new_id) in field_changes.items():
+                current_id = device.GetValue(field)
+                if current_id != old_id:
+                    skipped.append(ConductorChange(sect_id, field, current_id, new_id))
+                    continue
+                device.SetValue(new_id, field)
+                written.append((device, field, old_id))
+                device_written = True
+            if device_written:
+                devices += 1
+    except cympy.err.CymError:
+        for device, field, old_id in reversed(written):
+            device.SetValue(old_id, field)
+        raise
+
+    return devices, skipped
+
+
+def get_state_settings(max_depth, max_kva_diff, default_id_list, kva_mode, retry_mode):
+    """
+    Gets settings incremental state is valid for (state of run with other settings not used)
+    :param max_depth: Max sections upstream/downstream to look for conductor
+    :param max_kva_diff: Max percent difference in downstream kVA
+    :param default_id_list: Default conductor IDs list
+    :param kva_mode: KVACache mode
+    :param retry_mode: Input required retry mode
+    :return: Settings dictionary
+    """
+    return {'MAXDEPTH': max_depth, 'MAXKVADIFF': max_kva_diff, 'DEFAULTIDS': list(default_id_list),
+            'KVAMODE': kva_mode, 'RETRYMODE': retry_mode}
+
+
+def get_state_file(state_dir, ckt):
+    """
+    Gets incremental state file of circuit
+    :param state_dir: Incremental state directory
+    :param ckt: String of circuit name
+    :return: JSON file path (characters not safe in file names replaced)
+    """
+    return FeederCache.get_ckt_dir(state_dir, ckt) + '.fixcond.json'
+
+
+def get_cond_state(settings, topology, cond_table, kva_cache, ir_dict=None):
+    """
+    Gets incremental state of circuit, columns of topology and conductor table (columns shared with table, get state
+    again after table changes)
+    :param settings: Settings dictionary from get_state_settings
+    :param topology: Topology dictionary from get_topology
+    :param cond_table: Conductor table from get_conductors
+    :param kva_cache: KVACache of downstream kVA
+    :param ir_dict: Input required dictionary of run, None if not run yet
+    :return: State dictionary with keys SETTINGS, SECTIONS, PARENT (parent section IDs, None if none),
+    COND_SECTIONID, COND_DEVICETYPE (device type numbers), COND_ and every name in LINE_ID_NAMES,
+    COND_KVA (downstream kVA, None if not known), INPUTREQUIRED (lists of INPUT_REQUIRED_FIELDS of input required
+    conductors)
+    """
+    sect_ids = topology['SECTIONS']
+    sect_index = topology['INDEX']
+    kva = kva_cache.kva
+    state = {'SETTINGS': settings, 'SECTIONS': sect_ids,
+             'PARENT': [None if parent == -1 else sect_ids[parent] for parent in topology['PARENT']],
+             'COND_SECTIONID': cond_table['SECTIONID'],
+             'COND_DEVICETYPE': [int(device_type) for device_type in cond_table['DEVICETYPE']],
+             'COND_KVA': [None if math.isnan(kva[sect_index[sect_id]]) else kva[sect_index[sect_id]]
+                          for sect_id in cond_table['SECTIONID']],
+             'INPUTREQUIRED': []}
+    for line_id_name in LINE_ID_NAMES:
+        state['COND_' + line_id_name] = cond_table[line_id_name]
+    if ir_dict is not None:
+        for ir_cond in ir_dict.values():
+            state['INPUTREQUIRED'].append([getattr(ir_cond, field) for field in INPUT_REQUIRED_FIELDS])
+
+    return state
+
+
+def get_cond_records(state):
+    """
+    Gets record of every conductor of state (anything get_cond reads of conductor)
+    :param state: State dictionary from get_cond_state or load_cond_state
+    :return: Iterator of tuples of device type number, every line ID in LINE_ID_NAMES, downstream kVA (in conductor
+    table order)
+    """
+    columns = [state['COND_DEVICETYPE']] + [state['COND_' + line_id_name] for line_id_name in LINE_ID_NAMES] + \
+        [state['COND_KVA']]
+    return zip(*columns)
+
+
+def load_cond_state(state_dir, ckt, settings):
+    """
+    Loads incremental state of previous run of circuit
+    :param state_dir: Incremental state directory
+    :param ckt: String of circuit name
+    :param settings: Settings dictionary from get_state_settings
+    :return: State dictionary (see get_cond_state), None if circuit has no state, state is unreadable or of other
+    settings (full run)
+    """
+    state_file = get_state_file(state_dir, ckt)
+    if not os.path.isfile(state_file):
+        return None
+    try:
+        with open(state_file) as json_file:
+            state = json.load(json_file)
+    except (OSError, ValueError) as e:
+        print('Incremental state of {} unreadable, searching every default: {}'.format(ckt, e))
+        return None
+    if not isinstance(state, dict) or state.get('SETTINGS') != settings:
+        return None
+    return state
+
+
+def save_cond_state(state_dir, ckt, state):
+    """
+    Writes incremental state of circuit (call after changes are written to Cyme), written to temporary file first,
+    so crash while writing keeps previous state
+    :param state_dir: Incremental state directory
+    :param ckt: String of circuit name
+    :param state: State dictionary from get_cond_state
+    :return: None
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    state_file = get_state_file(state_dir, ckt)
+    # Encode at once (faster than streaming to file)
+    with open(state_file + '.tmp', 'w') as json_file:
+        json_file.write(json.dumps(state))
+    os.replace(state_file + '.tmp', state_file)
+
+
+def get_changed_sections(previous_state, state, topology):
+    """
+    Gets sections changed since previous run: new sections, sections with other parent, parents of removed
+    sections, sections with added, removed or changed conductor (device type, line IDs, downstream kVA)
+    :param previous_state: State dictionary of previous run from load_cond_state
+    :param state: State dictionary of circuit from get_cond_state
+    :param topology: Topology dictionary from get_topology
+    :return: Set of section positions
+    """
+    sect_index = topology['INDEX']
+    changed = set()
+
+    # Compare parent of every section (position by position if sections unchanged), removed sections change
+    # downstream of their parent
+    if previous_state['SECTIONS'] == state['SECTIONS']:
+        for sect_pos, (old_parent_id, parent_id) in enumerate(zip(previous_state['PARENT'], state['PARENT'])):
+            if old_parent_id != parent_id:
+                changed.add(sect_pos)
+    else:
+        old_parents = dict(zip(previous_state['SECTIONS'], previous_state['PARENT']))
+        for sect_id, parent_id in zip(state['SECTIONS'], state['PARENT']):
+            if sect_id not in old_parents or old_parents[sect_id] != parent_id:
+                changed.add(sect_index[sect_id])
+        for sect_id, parent_id in old_parents.items():
+            if sect_id not in sect_index and parent_id in sect_index:
+                changed.add(sect_index[parent_id])
+
+    # Compare conductor of every section (row by row if conductor sections unchanged), conductor removed from section
+    # changes section
+    if previous_state['COND_SECTIONID'] == state['COND_SECTIONID']:
+        for sect_id, old_record, cond_record in zip(state['COND_SECTIONID'], get_cond_records(previous_state),
+                                                    get_cond_records(state)):
+            if old_record != cond_record:
+                changed.add(sect_index[sect_id])
     else:
-        ckt = cympy.study.ListNetworks()[0]
+        old_conductors = dict(zip(previous_state['COND_SECTIONID'], get_cond_records(previous_state)))
+        conductors = dict(zip(state['COND_SECTIONID'], get_cond_records(state)))
+        for sect_id, cond_record in conductors.items():
+            if old_conductors.get(sect_id) != cond_record:
+                changed.add(sect_index[sect_id])
+        for sect_id in old_conductors:
+            if sect_id not in conductors and sect_id in sect_index:
+                changed.add(sect_index[sect_id])
 
-    # Get conductor dictionary, list of OH conductors, list of UG cables
-    conductor_dictionary, oh_list, oh_phase_list, ug_list = get_conductors(ckt, default_id_list)
+    return changed
 
-    # Create changed, input required dictionaries
+
+def plan_ckt_cond(ckt, max_depth, max_kva_diff, default_id_list, kva_mode='QUERY', retry_mode='SINGLE',
+                  cache_dir=None, refresh_cache=False, state_dir=None):
+    """
+    Plans default conductor assignment of circuit from upstream/downstream conductors without writing to Cyme
+    (later decisions see earlier planned changes through conductor table)
+    Incremental (state directory given, state of previous run with same settings exists): only defaults within
+    max_depth of sections changed since previous run are searched, input required conductors of unchanged
+    neighbourhoods carried forward (retried if within max_depth of a section reassigned in this run)
+    :param ckt: String of circuit name
+    :param max_depth: Max sections upstream/downstream to look for conductor
+    :param max_kva_diff: Max percent difference in downstream kVA
+    :param default_id_list: Default conductor IDs list
+    :param kva_mode: KVACache mode ('QUERY' or 'ACCUMULATE')
+    :param retry_mode: 'SINGLE' (retry input required once) or 'FIXPOINT' (retry near reassigned sections until
+    nothing changes)
+    :param cache_dir: Feeder cache directory of topology (see get_ckt_data), None to not use cache
+    :param refresh_cache: Bool to rewrite feeder cache even if valid
+    :param state_dir: Incremental state directory, None to search every default
+    :return: Tuple of ConductorChange (plan), changed dictionary, input required dictionary, conductor table,
+    state dictionary of circuit after plan (None if no state directory)
+    """
+    # Compile default conductor IDs once
+    default_matcher = DefaultMatcher(default_id_list)
+
+    # Get conductor table, rows of OH conductors, rows of UG cables, topology snapshot (walked instead of Cyme network
+    # iterators), downstream kVA of conductors once
+    conductor_table, oh_list, oh_phase_list, ug_list, topology, kva_cache = \
+        get_ckt_data(ckt, default_matcher, kva_mode, cache_dir, refresh_cache)
+
+    # Keep only defaults within max_depth of sections changed since previous run, carry input required conductors
+    # of other defaults forward
+    cond_state = None
+    previous_state = None
+    carried_dictionary = {}
+    if state_dir is not None:
+        settings = get_state_settings(max_depth, max_kva_diff, default_id_list, kva_mode, retry_mode)
+        cond_state = get_cond_state(settings, topology, conductor_table, kva_cache)
+        previous_state = load_cond_state(state_dir, ckt, settings)
+    if previous_state is not None:
+        affected = set()
+        for sect_pos in get_changed_sections(previous_state, cond_state, topology):
+            affected.add(sect_pos)
+            affected |= get_neighbourhood(topology, sect_pos, max_depth)
+        oh_list, oh_phase_list, ug_list = \
+            [[row for row in default_rows if topology['INDEX'][conductor_table['SECTIONID'][row]] in affected]
+             for default_rows in (oh_list, oh_phase_list, ug_list)]
+        for sect_id, up_id, down_id, line_id_name in previous_state['INPUTREQUIRED']:
+            # Conductor still default (searched by full run) on section of unchanged neighbourhood
+            # (removed sections are not in conductor table)
+            if sect_id in conductor_table['ROW'] and conductor_table['DEFAULT'][conductor_table['ROW'][sect_id]] and \
+                    topology['INDEX'][sect_id] not in affected:
+                carried_dictionary[(sect_id, line_id_name)] = \
+                    InputRequiredConductor(sect_id, up_id, down_id, line_id_name, conductor_table['ROW'][sect_id])
+        print('Incremental run: {} of {} sections affected'.format(len(affected), len(topology['SECTIONS'])))
+
+    Instrumentation.mark('search')
+
+    # Create plan, changed, input required dictionaries
+    plan = []
     changed_dictionary = {}
     input_required_dictionary = {}
 
     # Iterate through OH conductor list
-    for oh_conductor in oh_list:
+    for oh_row in oh_list:
         line_id = ['LineID']
         # Check if conductor is default
-        if check_default_cond(oh_conductor.GetValue(line_id[0]), default_id_list):
+        if conductor_table['DEFAULT'][oh_row] & LINE_ID_BITS[line_id[0]]:
             changed_dictionary, input_required_dictionary = \
-                assign_cond(oh_conductor, line_id, conductor_dictionary, changed_dictionary, input_required_dictionary,
-                            max_depth, max_kva_diff, default_id_list)
+                assign_cond(oh_row, line_id, conductor_table, changed_dictionary, input_required_dictionary,
+                            max_depth, max_kva_diff, default_matcher, topology, kva_cache, plan)
 
     # Iterate through OH phase conductor list
-    for oh_phase_conductor in oh_phase_list:
+    for oh_phase_row in oh_phase_list:
         line_id = ['PhaseConductorIDA', 'PhaseConductorIDB', 'PhaseConductorIDC',
                    'NeutralConductorID1', 'NeutralConductorID2']
-        # Check if conductor is default
-        if check_default_cond(oh_phase_conductor.GetValue(line_id[0]), default_id_list) or \
-                check_default_cond(oh_phase_conductor.GetValue(line_id[1]), default_id_list) or \
-                check_default_cond(oh_phase_conductor.GetValue(line_id[2]), default_id_list) or \
-                check_default_cond(oh_phase_conductor.GetValue(line_id[3]), default_id_list) or \
-                check_default_cond(oh_phase_conductor.GetValue(line_id[4]), default_id_list):
+        # Check if conductor is default (any line ID)
+        if conductor_table['DEFAULT'][oh_phase_row]:
             changed_dictionary, input_required_dictionary = \
-                assign_cond(oh_phase_conductor, line_id, conductor_dictionary,
-                            changed_dictionary, input_required_dictionary, max_depth, max_kva_diff, default_id_list)
+                assign_cond(oh_phase_row, line_id, conductor_table,
+                            changed_dictionary, input_required_dictionary, max_depth, max_kva_diff, default_matcher,
+                            topology, kva_cache, plan)
 
     # Iterate through UG conductor list
-    for ug_cable in ug_list:
+    for ug_row in ug_list:
         line_id = ['CableID']
         # Check if conductor is default
-        if check_default_cond(ug_cable.GetValue(line_id[0]), default_id_list):
+        if conductor_table['DEFAULT'][ug_row] & LINE_ID_BITS[line_id[0]]:
             changed_dictionary, input_required_dictionary = \
-                assign_cond(ug_cable, line_id, conductor_dictionary, changed_dictionary, input_required_dictionary,
-                            max_depth, max_kva_diff, default_id_list)
+                assign_cond(ug_row, line_id, conductor_table, changed_dictionary, input_required_dictionary,
+                            max_depth, max_kva_diff, default_matcher, topology, kva_cache, plan)
+
+    # Retry carried conductors within max_depth of sections reassigned in this run
+    if carried_dictionary:
+        reassigned = set()
+        for changed_cond in changed_dictionary.values():
+            reassigned |= get_neighbourhood(topology, topology['INDEX'][changed_cond.SECTION], max_depth)
+        for ir_key, ir_cond in list(carried_dictionary.items()):
+            if topology['INDEX'][ir_cond.SECTION] in reassigned:
+                input_required_dictionary[ir_key] = carried_dictionary.pop(ir_key)
+
+    # Retry input required conductors near reassigned sections until nothing changes
+    if retry_mode == 'FIXPOINT':
+        changed_dictionary, default_dictionary, waves = \
+            retry_cond_fixpoint(input_required_dictionary, changed_dictionary, conductor_table, max_depth,
+                                max_kva_diff, default_matcher, topology, kva_cache, plan)
+        print('Input required retry waves: ' + str(waves))
+    # Else go through input required dictionary once (try to fix remaining defaults again)
+    else:
+        # Initialize final default dictionary
+        default_dictionary = {}
+
+        for sect, default_cond in input_required_dictionary.items():
+            line_id = [default_cond.LINEID]
+            changed_dictionary, default_dictionary = \
+                assign_cond(default_cond.ROW, line_id, conductor_table, changed_dictionary, default_dictionary,
+                            max_depth, max_kva_diff, default_matcher, topology, kva_cache, plan)
+
+    # Add carried conductors (still input required) to input required dictionary
+    default_dictionary.update(carried_dictionary)
+
+    Instrumentation.mark(None)
+    print('kVA cache hit rate: {:.1%}'.format(kva_cache.hit_rate()))
+
+    # Get state of circuit after plan
+    if state_dir is not None:
+        cond_state = get_cond_state(settings, topology, conductor_table, kva_cache, default_dictionary)
+
+    return tuple(plan), changed_dictionary, default_dictionary, conductor_table, cond_state
+
+
+def fix_ckt_cond(ckt, max_depth, max_kva_diff, default_id_list, kva_mode='QUERY', retry_mode='SINGLE',
+                 cache_dir=None, refresh_cache=False, state_dir=None):
+    """
+    Assigns default conductors of circuit from upstream/downstream conductors (plans, then writes plan to Cyme)
+    :param ckt: String of circuit name
+    :param max_depth: Max sections upstream/downstream to look for conductor
+    :param max_kva_diff: Max percent difference in downstream kVA
+    :param default_id_list: Default conductor IDs list
+    :param kva_mode: KVACache mode ('QUERY' or 'ACCUMULATE')
+    :param retry_mode: 'SINGLE' (retry input required once) or 'FIXPOINT' (retry near reassigned sections until
+    nothing changes)
+    :param cache_dir: Feeder cache directory of topology (see get_ckt_data), None to not use cache
+    :param refresh_cache: Bool to rewrite feeder cache even if valid
+    :param state_dir: Incremental state directory (see plan_ckt_cond, state written after writing changes),
+    None to search every default
+    :return: Changed dictionary, input required dictionary
+    """
+    # Plan changes
+    start_time = time.perf_counter()
+    plan, changed_dictionary, default_dictionary, conductor_table, cond_state = \
+        plan_ckt_cond(ckt, max_depth, max_kva_diff, default_id_list, kva_mode, retry_mode, cache_dir,
+                      refresh_cache, state_dir)
+    plan_time = time.perf_counter() - start_time
+
+    # Write changes
+    start_time = time.perf_counter()
+    Instrumentation.mark('assign')
+    devices, skipped = apply_plan(plan, conductor_table)
+    # Drop results of fields edited in Cyme since they were read, keep previous state so next run searches edited
+    # sections again
+    for change in skipped:
+        changed_dictionary.pop((change.SECTION, change.FIELD), None)
+        print('Skipped {} {}: {} in Cyme, planned {}'.format(change.SECTION, change.FIELD, change.OLD, change.NEW))
+    # Keep state of circuit for next incremental run
+    if state_dir is not None and not skipped:
+        save_cond_state(state_dir, ckt, cond_state)
+    Instrumentation.mark(None)
+    apply_time = time.perf_counter() - start_time
+
+    print('Planned {} changes in {:.2f} s, wrote {} devices in {:.2f} s'.format(len(plan), plan_time, devices,
+                                                                             apply_time))
+
+    return changed_dictionary, default_dictionary
+
+
+def fix_cond(profile_file=None, sample_every=1):
+    """
+    Assigns default conductors of loaded circuit, shows changed and input required reports
+    :param profile_file: JSON file path to write run profile to (cympy calls, phases), None to not profile
+    :param sample_every: Time every n-th call of each cympy function when profiling
+    :return: None
+    """
+
+    #################################################################################################
+    # Assumptions
+    max_depth = 3
+    max_kva_diff = 0.1
+    kva_mode = 'QUERY'
+    retry_mode = 'SINGLE'
+    default_id_list = ['DEFAULT', 'N/A']
+    cache_dir = None
+    state_dir = None
+    # Max rows of each report (None for every row), one row per distinct value instead of per conductor,
+    # directory to export full results to (CSV, None to not export)
+    report_rows = None
+    report_summary = False
+    export_dir = None
+    #################################################################################################
+
+    with Instrumentation.profiling(profile_file, sample_every):
+        # Check for multiple circuits, else set circuit name
+        if len(cympy.study.ListNetworks()) > 1:
+            raise ValueError('Found more than one circuit')
+        elif len(cympy.study.ListNetworks()) == 0:
+            raise ValueError('No circuit loaded')
+        else:
+            ckt = cympy.study.ListNetworks()[0]
+
+        # Assign default conductors
+        changed_dictionary, default_dictionary = fix_ckt_cond(ckt, max_depth, max_kva_diff, default_id_list,
+                                                              kva_mode, retry_mode, cache_dir, state_dir=state_dir)
+
+        # Export full results, create Cyme reports
+        Instrumentation.mark('report')
+        if export_dir is not None:
+            os.makedirs(export_dir, exist_ok=True)
+            export_records(changed_dictionary, FeederCache.get_ckt_dir(export_dir, ckt) + '.changed.csv',
+                           CHANGED_FIELDS)
+            export_records(default_dictionary, FeederCache.get_ckt_dir(export_dir, ckt) + '.input_required.csv',
+                           INPUT_REQUIRED_FIELDS)
+        cyme_report(changed_dictionary, 'Changed Conductors', CHANGED_FIELDS, report_rows, report_summary)
+        cyme_report(default_dictionary, 'Input Required Conductors', INPUT_REQUIRED_FIELDS, report_rows,
+                    report_summary)
+
 
-    # Initialize final default dictionary
+def get_study_circuits(studies):
+    """
+    Groups batch studies by study file, so each file is opened and saved by one worker
+    :param studies: List of study files or (study file, circuit name) tuples
+    :return: Ordered dictionary of study file to list of circuit names (None for every circuit of study),
+    dictionary of study file to list of studies (as given) of file
+    """
+    study_circuits = collections.OrderedDict()
+    file_studies = collections.OrderedDict()
+    for study in studies:
+        if isinstance(study, tuple):
+            study_file, ckt = study
+        else:
+            study_file, ckt = study, None
+        file_studies.setdefault(study_file, []).append(study)
+        # Whole study given once covers every circuit of file
+        if ckt is None:
+            study_circuits[study_file] = None
+        elif study_circuits.setdefault(study_file, []) is not None and ckt not in study_circuits[study_file]:
+            study_circuits[study_file].append(ckt)
+
+    return study_circuits, file_studies
+
+
+def fix_study_cond(study_file, ckt_names, settings):
+    """
+    Loads study, assigns default conductors of every circuit in study (or given circuits), saves study
+    (runs in batch worker process)
+    :param study_file: Study file string
+    :param ckt_names: List of circuit names, None for every circuit of study
+    :param settings: Dictionary of fix_ckt_cond keyword arguments
+    :return: Study file string, list of changed records, list of input required records (records include CIRCUIT),
+    dictionary of circuit name to run time in seconds
+    """
+    changed_records = []
+    ir_records = []
+    ckt_times = {}
+
+    cympy.study.Open(study_file)
+    try:
+        if ckt_names is None:
+            ckt_names = cympy.study.ListNetworks()
+        for ckt in ckt_names:
+            start_time = time.perf_counter()
+            changed_dictionary, default_dictionary = fix_ckt_cond(ckt, **settings)
+            ckt_times[ckt] = time.perf_counter() - start_time
+
+            # Add circuit to records, drop table rows (only valid in this process)
+            for changed_cond in changed_dictionary.values():
+                changed_records.append(changed_cond._replace(CIRCUIT=ckt))
+            for default_cond in default_dictionary.values():
+                ir_records.append(default_cond._replace(ROW=None, CIRCUIT=ckt))
+
+        cympy.study.Save(study_file)
+    finally:
+        cympy.study.Close(False)
+
+    return study_file, changed_records, ir_records, ckt_times
+
+
+def fix_cond_batch(studies, workers=None, show_report=False, report_rows=None, report_summary=False, export_dir=None,
+                   **settings):
+    """
+    Assigns default conductors of many circuits in parallel, study files sharded across worker processes
+    (each worker loads own study file once for all its circuits), results merged into one combined report
+    (study file that fails is reported as failed, results of other study files still merged)
+    :param studies: List of study files or (study file, circuit name) tuples
+    :param workers: Number of worker processes (None for number of CPUs)
+    :param show_report: Bool to show combined Cyme reports (only when run in Cyme)
+    :param report_rows: Max rows of each report, None for every row
+    :param report_summary: Bool to show one row per distinct value in reports instead of one row per conductor
+    :param export_dir: Directory to export combined results to (changed.csv, input_required.csv), None to not export
+    :param settings: fix_ckt_cond keyword arguments (max_depth, max_kva_diff, default_id_list, kva_mode, retry_mode,
+    cache_dir, refresh_cache, state_dir)
+    :return: Combined changed dictionary, combined input required dictionary (keyed by (circuit name, section ID,
+    line ID field)),
+    dictionary of (study file, circuit name) to run time in seconds, dictionary of failed study (as given) to error
+    message
+    """
+    settings.setdefault('max_depth', 3)
+    settings.setdefault('max_kva_diff', 0.1)
+    settings.setdefault('default_id_list', ['DEFAULT', 'N/A'])
+
+    changed_dictionary = {}
     default_dictionary = {}
+    ckt_times = {}
+    failed = {}
+
+    # One worker per study file (circuits of same file written by one worker, saved once)
+    study_circuits, file_studies = get_study_circuits(studies)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fix_study_cond, study_file, ckt_names, settings): study_file
+                   for study_file, ckt_names in study_circuits.items()}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                study_file, changed_records, ir_records, study_times = future.result()
+            except Exception as e:
+                # Keep results of other study files, report failed studies of file
+                error = e.GetMessage() if isinstance(e, cympy.err.CymError) else '{}: {}'.format(type(e).__name__, e)
+                for study in file_studies[futures[future]]:
+                    failed[study] = error
+                    print('{}: failed, {}'.format(study, error))
+                continue
+            for changed_cond in changed_records:
+                changed_dictionary[(changed_cond.CIRCUIT, changed_cond.SECTION, changed_cond.LINEID)] = changed_cond
+            for default_cond in ir_records:
+                default_dictionary[(default_cond.CIRCUIT, default_cond.SECTION, default_cond.LINEID)] = default_cond
+            for ckt, ckt_time in study_times.items():
+                print('{}: {} ({:.1f} s)'.format(study_file, ckt, ckt_time))
+                ckt_times[(study_file, ckt)] = ckt_time
 
-    # Go through input required dictionary (try to fix remaining defaults again)
-    for sect, default_cond in input_required_dictionary.items():
-        line_id = [default_cond['LINEID']]
-        changed_dictionary, default_dictionary = \
-            assign_cond(default_cond['COND'], line_id, conductor_dictionary, changed_dictionary, default_dictionary,
-                        max_depth, max_kva_diff, default_id_list)
+    # Export combined results, create combined Cyme reports
+    if export_dir is not None:
+        os.makedirs(export_dir, exist_ok=True)
+        export_records(changed_dictionary, os.path.join(export_dir, 'changed.csv'), ['CIRCUIT'] + CHANGED_FIELDS)
+        export_records(default_dictionary, os.path.join(export_dir, 'input_required.csv'),
+                       ['CIRCUIT'] + INPUT_REQUIRED_FIELDS)
+    if show_report:
+        cyme_report(changed_dictionary, 'Changed Conductors', ['CIRCUIT'] + CHANGED_FIELDS, report_rows,
+                    report_summary)
+        cyme_report(default_dictionary, 'Input Required Conductors', ['CIRCUIT'] + INPUT_REQUIRED_FIELDS,
+                    report_rows, report_summary)
 
-    # Create Cyme reports
-    cyme_report(changed_dictionary, 'Changed Conductors', ['SECTION', 'OLD', 'NEW', 'LINEID'])
-    cyme_report(default_dictionary, 'Input Required Conductors', ['SECTION', 'UPSTREAM', 'DOWNSTREAM', 'LINEID'])
+    return changed_dictionary, default_dictionary, ckt_times, failed
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+import os
+import re
+import shutil
+import zlib
+
+
+def fingerprint(ids):
+    """
+    Gets cheap fingerprint of circuit from IDs of its sections
+    :param ids: List of section IDs or keys (in study order)
+    :return: String of number of IDs and CRC32 checksum of IDs
+    """
+    return '{}-{:08x}'.format(len(ids), zlib.crc32('\n'.join(ids).encode('utf-8')))
+
+
+def get_ckt_dir(cache_dir, ckt):
+    """
+    Gets cache directory of circuit
+    :param cache_dir: Cache directory
+    :param ckt: String of circuit name
+    :return: Directory path (characters not safe in file names replaced)
+    """
+    return os.path.join(cache_dir, re.sub(r'[^\w.-]', '_', ckt))
+
+
+def get_fingerprint(cache_dir, ckt):
+    """
+    Gets fingerprint of cached circuit
+    :param cache_dir: Cache directory
+    :param ckt: String of circuit name
+    :return: Fingerprint string, None if circuit not cached (or cache partly written)
+    """
+    fingerprint_file = os.path.join(get_ckt_dir(cache_dir, ckt), 'FINGERPRINT')
+    if not os.path.isfile(fingerprint_file):
+        return None
+    with open(fingerprint_file) as ckt_file:
+        return ckt_file.read()
+
+
+def load(cache_dir, ckt, ckt_fingerprint):
+    """
+    Maps cached arrays of circuit (read only, copy values out and drop arrays before saving circuit again)
+    :param cache_dir: Cache directory
+    :param ckt: String of circuit name
+    :param ckt_fingerprint: Fingerprint of circuit in study
+    :return: Dictionary of array name to memory-mapped array, None if circuit not cached or fingerprint changed
+    """
+    import numpy as np
+
+    if get_fingerprint(cache_dir, ckt) != ckt_fingerprint:
+        return None
+
+    ckt_dir = get_ckt_dir(cache_dir, ckt)
+    arrays = {}
+    for file_name in os.listdir(ckt_dir):
+        if file_name.endswith('.npy'):
+            arrays[file_name[:-len('.npy')]] = np.load(os.path.join(ckt_dir, file_name), mmap_mode='r')
+    return arrays
+
+
+def save(cache_dir, ckt, ckt_fingerprint, arrays):
+    """
+    Writes arrays of circuit, cache of other fingerprint is removed first
+    (fingerprint written last, so partly written cache is never loaded)
+    :param cache_dir: Cache directory
+    :param ckt: String of circuit name
+    :param ckt_fingerprint: Fingerprint of circuit in study
+    :param arrays: Dictionary of array name to list of strings, array or numpy array (replaces cached array of name)
+    :return: None
+    """
+    import numpy as np
+
+    ckt_dir = get_ckt_dir(cache_dir, ckt)
+    fingerprint_file = os.path.join(ckt_dir, 'FINGERPRINT')
+    cached_fingerprint = get_fingerprint(cache_dir, ckt)
+    if cached_fingerprint is not None and cached_fingerprint != ckt_fingerprint:
+        shutil.rmtree(ckt_dir)
+    elif cached_fingerprint is not None:
+        os.remove(fingerprint_file)
+    os.makedirs(ckt_dir, exist_ok=True)
+
+    for name, values in arrays.items():
+        if isinstance(values, list):
+            values = np.array(values, dtype=str)
+        np.save(os.path.join(ckt_dir, name + '.npy'), np.asarray(values))
+    with open(fingerprint_file, 'w') as ckt_file:
+        ckt_file.write(ckt_fingerprint)
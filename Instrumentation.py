@@ -0,0 +1,220 @@
+import collections
+import contextlib
+import json
+import threading
+import time
+
+# Active profiler (None when not profiling, phase marks do nothing)
+PROFILER = None
+
+# Cympy functions timed (module attribute, function name), functions with results wrapped to time their methods
+CYMPY_FUNCTIONS = [('study', 'ListNetworks'), ('study', 'ListDevices'), ('study', 'ListSections'),
+                   ('study', 'ListNodes'), ('study', 'GetSection'), ('study', 'GetNode'), ('study', 'GetDevice'),
+                   ('study', 'NetworkIterator'), ('study', 'QueryInfoDevice'), ('study', 'QueryInfoNode'),
+                   ('study', 'SetValueDevice'), ('study', 'AddSection'), ('study', 'Save'),
+                   ('eq', 'ListEquipments'), ('eq', 'Add'), ('eq', 'SetValue')]
+DEVICE_METHODS = ['GetValue', 'SetValue', 'Execute']
+ITERATOR_METHODS = ['Next', 'GetSection']
+CURSOR_METHODS = ['execute', 'prepare', 'executemany', 'fetchall', 'fetchmany', 'fetchone']
+CONNECTION_METHODS = ['commit', 'rollback']
+
+
+class Profiler(object):
+    """
+    Run profile: call counts and latency of wrapped functions, wall time of phases (phases of each thread marked
+    with mark, every phase ends where next one starts)
+    Sampling: every call counted, only first and every sample_every-th call after it timed (latency of other calls
+    estimated)
+    """
+
+    def __init__(self, sample_every=1):
+        """
+        Creates empty profile
+        :param sample_every: Time every n-th call of each function (1 to time every call)
+        """
+        self.sample_every = sample_every
+        self.calls = collections.Counter()
+        self.sampled = collections.Counter()
+        self.latency = collections.Counter()
+        self.phases = collections.Counter()
+        self.patches = []
+        self.current = threading.local()
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+
+    def timed(self, name, func, proxy=None):
+        """
+        Wraps function to count and (sampled) time calls
+        :param name: Name of function in profile
+        :param func: Function
+        :param proxy: (name prefix, list of method names) of result methods to time (result wrapped in Proxy,
+            list results wrapped item by item), None to return result as is
+        :return: Wrapped function
+        """
+        def wrapper(*args, **kwargs):
+            self.calls[name] += 1
+            if (self.calls[name] - 1) % self.sample_every:
+                result = func(*args, **kwargs)
+            else:
+                start_time = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    self.sampled[name] += 1
+                    self.latency[name] += time.perf_counter() - start_time
+            if proxy is None or result is None:
+                return result
+            if isinstance(result, list):
+                return [Proxy(item, self, *proxy) for item in result]
+            return Proxy(result, self, *proxy)
+
+        return wrapper
+
+    def patch(self, owner, attribute, name, proxy=None):
+        """
+        Replaces function attribute of object (module) with timed function
+        :param owner: Object with function attribute
+        :param attribute: Attribute name
+        :param name: Name of function in profile
+        :param proxy: See timed
+        :return: None
+        """
+        own_attribute = attribute in vars(owner)
+        original = getattr(owner, attribute)
+        setattr(owner, attribute, self.timed(name, original, proxy))
+        self.patches.append((owner, attribute, original, own_attribute))
+
+    def install(self):
+        """
+        Times cympy functions used by AssignConductor and SQLGeneration (devices and network iterators returned
+        by cympy are wrapped to time their methods)
+        :return: None
+        """
+        import cympy
+
+        for module_name, function_name in CYMPY_FUNCTIONS:
+            if function_name in ('GetDevice', 'ListDevices'):
+                proxy = ('Device', DEVICE_METHODS)
+            elif function_name == 'NetworkIterator':
+                proxy = ('NetworkIterator', ITERATOR_METHODS)
+            else:
+                proxy = None
+            self.patch(getattr(cympy, module_name), function_name, module_name + '.' + function_name, proxy)
+
+    def uninstall(self):
+        """
+        Restores patched functions
+        :return: None
+        """
+        for owner, attribute, original, own_attribute in reversed(self.patches):
+            if own_attribute:
+                setattr(owner, attribute, original)
+            else:
+                delattr(owner, attribute)
+        self.patches = []
+
+    def wrap_connection(self, con, cur):
+        """
+        Wraps Oracle connection and cursor to time their calls (cursors opened on connection are wrapped too)
+        :param con: Oracle connection
+        :param cur: Oracle cursor
+        :return: Wrapped connection, wrapped cursor
+        """
+        con_proxy = Proxy(con, self, 'connection', CONNECTION_METHODS)
+        cursor = con.cursor
+        con_proxy.__dict__['cursor'] = lambda: Proxy(cursor(), self, 'cursor', CURSOR_METHODS)
+        return con_proxy, Proxy(cur, self, 'cursor', CURSOR_METHODS)
+
+    def mark(self, name):
+        """
+        Ends current phase of this thread, starts next phase
+        :param name: Phase name, None to only end current phase
+        :return: None
+        """
+        now = time.perf_counter()
+        current = getattr(self.current, 'phase', None)
+        if current is not None:
+            with self.lock:
+                self.phases[current[0]] += now - current[1]
+        self.current.phase = None if name is None else (name, now)
+
+    def profile(self):
+        """
+        Gets profile (latency of calls not timed estimated from timed calls)
+        :return: Profile dictionary
+        """
+        calls = {}
+        for name, count in sorted(self.calls.items()):
+            sampled = self.sampled[name]
+            seconds = self.latency[name] * count / sampled if sampled else 0.0
+            calls[name] = {'COUNT': count, 'SAMPLED': sampled, 'SECONDS': seconds,
+                           'MEAN': seconds / count if count else 0.0}
+        return {'WALLTIME': time.perf_counter() - self.start_time, 'SAMPLEEVERY': self.sample_every,
+                'PHASES': dict(self.phases), 'CALLS': calls}
+
+    def write(self, profile_file):
+        """
+        Writes profile to JSON file
+        :param profile_file: JSON file path
+        :return: Profile dictionary
+        """
+        profile = self.profile()
+        with open(profile_file, 'w') as json_file:
+            json.dump(profile, json_file, indent=2)
+        return profile
+
+
+class Proxy(object):
+    """
+    Wraps object, timing given methods (methods wrapped when looked up, other attributes passed through)
+    """
+
+    def __init__(self, target, profiler, prefix, methods):
+        self.__dict__.update(_target=target, _profiler=profiler, _prefix=prefix, _methods=methods)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name in self._methods:
+            return self._profiler.timed(self._prefix + '.' + name, value)
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+
+def mark(name):
+    """
+    Ends current phase of this thread and starts next phase of active profiler (nothing if not profiling)
+    :param name: Phase name ('load', 'classify', 'search', 'assign', 'report', 'fetch', 'validate', 'place',
+        'write'), None to only end current phase
+    :return: None
+    """
+    profiler = PROFILER
+    if profiler is not None:
+        profiler.mark(name)
+
+
+@contextlib.contextmanager
+def profiling(profile_file=None, sample_every=1):
+    """
+    Profiles run in with block, writes JSON profile at end
+    :param profile_file: JSON file path, None to not profile (yields None)
+    :param sample_every: Time every n-th call of each function
+    :return: Profiler (None if not profiling)
+    """
+    global PROFILER
+
+    if profile_file is None:
+        yield None
+        return
+
+    profiler = Profiler(sample_every)
+    profiler.install()
+    PROFILER = profiler
+    try:
+        yield profiler
+    finally:
+        profiler.mark(None)
+        PROFILER = None
+        profiler.uninstall()
+        profiler.write(profile_file)
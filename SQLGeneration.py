@@ -1,94 +1,334 @@
-def create_generator(con, cur):
+# Generator validation rules, checked in order on rows that passed every earlier rule
+# (error message, rows rule applies to (None for all rows), rows that pass rule)
+# Rule functions take generator data frame (empty values as '') and numeric columns (NaN if empty or not numeric,
+# *INT columns truncated like int(), NODEKV is base kV of node, NaN if node not in circuit)
+# Error message None skips row without error (node not in circuit, will try on another circuit)
+GENERATOR_RULES = [
+    ('Incorrect generator type.', None,
+     lambda gen, num: gen['GENERATORTYPE'].isin(['ECG', 'INDUCTION', 'SYNCHRONOUS'])),
+    ('Missing node.', None,
+     lambda gen, num: gen['NODE'] != ''),
+    (None, None,
+     lambda gen, num: num['NODEKV'].notna()),
+    ('Node voltage incorrect.', None,
+     lambda gen, num: num['NODEKV'] == num['RATEDKVLL']),
+    ('Missing active generation.', None,
+     lambda gen, num: gen['ACTIVEGENERATION'] != ''),
+    ('Incorrect power factor.',
+     lambda gen, num: gen['GENERATORTYPE'] == 'INDUCTION',
+     lambda gen, num: num['POWERFACTOR'].notna() & (num['POWERFACTOR'] >= 0) & (num['POWERFACTORINT'] <= 100)),
+    ('Incorrect control type.',
+     lambda gen, num: gen['GENERATORTYPE'] == 'SYNCHRONOUS',
+     lambda gen, num: gen['CONTROLTYPE'].isin(['Fixed_Generation', 'Voltage_Controlled'])),
+    ('Incorrect power factor.',
+     lambda gen, num: (gen['GENERATORTYPE'] == 'SYNCHRONOUS') & (gen['CONTROLTYPE'] == 'Fixed_Generation'),
+     lambda gen, num: num['POWERFACTOR'].notna() & (num['POWERFACTOR'] >= 0) & (num['POWERFACTORINT'] <= 100)),
+    ('Incorrect min/max reactance.',
+     lambda gen, num: (gen['GENERATORTYPE'] == 'SYNCHRONOUS') & (gen['CONTROLTYPE'] == 'Voltage_Controlled'),
+     lambda gen, num: num['MAXREACTANCE'].notna() & num['MINREACTANCE'].notna() &
+     (num['MAXREACTANCEINT'] >= num['MINREACTANCEINT'])),
+    ('Generator already added.', None,
+     lambda gen, num: gen['ADDED'] == ''),
+]
+
+# Device values of generator keywords written after equipment ID and active generation, (property, value) in order
+# (values of rows added by get_generator_config)
+GENERATOR_TEMPLATES = {
+    # ECG inverter ratings for KVA, KW, KVAR
+    'ECG': [('Inverter.ConverterRating', 1000), ('Inverter.ActivePowerRating', 1000),
+            ('Inverter.ReactivePowerRating', 1000)],
+    'SYNCHGEN': [],
+    'INDUCTGEN': [],
+}
+# Device commands of generator keywords executed in order after values are written
+GENERATOR_COMMANDS = {
+    # ECG Inverter Control PowerFactor to 100%
+    'ECG': ['Inverter.InverterControls[0].SetType(ConverterControlVoltVarVV11)',
+            'Inverter.InverterControls[0].SetType(ConverterControlPowerFactor)'],
+    'SYNCHGEN': [],
+    'INDUCTGEN': [],
+}
+
+# Columns of GENERATORS used by validation, placement and delta write-back (only columns selected in 'DELTA' mode)
+GENERATOR_COLUMNS = ['GENERATORTYPE', 'NODE', 'RATEDKVLL', 'ACTIVEGENERATION', 'POWERFACTOR', 'CONTROLTYPE',
+                     'MAXREACTANCE', 'MINREACTANCE', 'ADDED', 'ERRORMESSAGE']
+
+
+def get_study_nodes():
     """
-    Add generators to circuit
+    Lists every node of loaded study once
+    :return: Dictionary of node ID to node
+    """
+    import cympy
+
+    study_nodes = {}
+    for node in cympy.study.ListNodes():
+        study_nodes[node.ID] = node
+
+    return study_nodes
+
+
+def get_node_index(node_ids=None, study_nodes=None):
+    """
+    Builds node index of loaded study (all nodes listed once), base kV and network ID queried once per node
+    :param node_ids: Node IDs to index (nodes not in study are left out), None for every node in study
+    :param study_nodes: Dictionary of node ID to node from get_study_nodes, None to list nodes of study
+    :return: Data frame indexed by node ID with columns KVLLBASE, NETWORKID, X, Y
+    """
+    import pandas as pd
+    import cympy
+
+    # Get every node of study once
+    if study_nodes is None:
+        study_nodes = get_study_nodes()
+
+    # Keep distinct requested nodes that are in study
+    if node_ids is None:
+        index_ids = list(study_nodes)
+    else:
+        index_ids = [node_id for node_id in pd.unique(pd.Series(node_ids, dtype=object)) if node_id in study_nodes]
+
+    node_index = pd.DataFrame({'KVLLBASE': [float(cympy.study.QueryInfoNode('KVLLBase', node_id))
+                                            for node_id in index_ids],
+                               'NETWORKID': [cympy.study.QueryInfoNode('NetworkId', node_id) for node_id in index_ids],
+                               'X': [study_nodes[node_id].X for node_id in index_ids],
+                               'Y': [study_nodes[node_id].Y for node_id in index_ids]},
+                              index=pd.Index(index_ids, name='NODE', dtype=object))
+    node_index['KVLLBASE'] = node_index['KVLLBASE'].astype(float)
+
+    return node_index
+
+
+def validate_generators(gen_data, node_kv):
+    """
+    Checks generator rows against GENERATOR_RULES (whole data frame at once), sets error message of failed rows
+    :param gen_data: Generator data frame (empty values as '')
+    :param node_kv: Series of base kV of each row's node (NaN if node not in circuit)
+    :return: Boolean series of rows that passed every rule
+    """
+    import pandas as pd
+    import numpy as np
+
+    # Numeric columns, empty or not numeric values as NaN
+    num = pd.DataFrame({'NODEKV': node_kv}, index=gen_data.index)
+    for column in ('RATEDKVLL', 'POWERFACTOR', 'MAXREACTANCE', 'MINREACTANCE'):
+        num[column] = pd.to_numeric(gen_data[column], errors='coerce')
+        num[column + 'INT'] = np.trunc(num[column])
+
+    # Apply rules in order, rows failing rule get error message and aren't checked against later rules
+    valid = pd.Series(True, index=gen_data.index)
+    for message, applies, passes in GENERATOR_RULES:
+        failed = valid & ~passes(gen_data, num)
+        if applies is not None:
+            failed &= applies(gen_data, num)
+        if message is not None:
+            gen_data.loc[failed, 'ERRORMESSAGE'] = message
+        valid &= ~failed
+
+    return valid
+
+
+def write_generators_replace(con, cur, gen_data):
+    """
+    Writes generator rows back by deleting every pending row and inserting all rows again (as strings)
+    If data frame has ROW_ID column (one chunk of rows), only rows of chunk are deleted, keyed by ROWID
     :param con: Oracle connection to CMATE Apex
     :param cur: Oracle cursor to CMATE Apex
+    :param gen_data: Generator data frame
     :return: None
     """
+    # Write table to SQL
+    table_name = 'GENERATORS'
+    row_ids = None
+    if 'ROW_ID' in gen_data.columns:
+        row_ids = [(row_id,) for row_id in gen_data['ROW_ID']]
+        gen_data = gen_data.drop(columns='ROW_ID')
+    column_names = gen_data.columns
+    gen_data = gen_data.astype(str)
+    insert_data = gen_data.values.tolist()
+    del gen_data
+
+    # Clear existing results in table for given circuit (or rows of chunk)
+    if row_ids is None:
+        sql = 'DELETE FROM ' + table_name + ' WHERE ADDED IS NULL AND ERRORMESSAGE IS NULL'
+        cur.execute(sql)
+    else:
+        cur.prepare('DELETE FROM ' + table_name + ' WHERE ROWID = :1')
+        cur.executemany(None, row_ids)
+    con.commit()
+
+    # Insert new results
+    sql = 'INSERT INTO ' + table_name + ' (' + ', '.join(column_names) + ') VALUES ('
+    for col_number in range(1, len(column_names) + 1):
+        if col_number != 1:
+            sql += ', '
+        sql += ':' + str(col_number)
+    sql += ')'
+
+    cur.prepare(sql)
+    cur.executemany(None, insert_data)
+    con.commit()
+
+
+def write_generators_delta(con, cur, gen_data, batch_size=1000):
+    """
+    Writes back only generator rows that got ADDED or ERRORMESSAGE set, keyed by ROWID (ROW_ID column),
+    in batched updates, committed as one transaction (NULLs and numbers kept)
+    :param con: Oracle connection to CMATE Apex
+    :param cur: Oracle cursor to CMATE Apex
+    :param gen_data: Generator data frame with ROW_ID column
+    :param batch_size: Number of rows per batch
+    :return: Number of rows updated
+    """
+    # Get rows that changed (selected rows had both empty)
+    changed = gen_data[(gen_data['ADDED'] != '') | (gen_data['ERRORMESSAGE'] != '')]
+    update_data = [(None if added == '' else int(added), None if message == '' else str(message), row_id)
+                   for added, message, row_id in zip(changed['ADDED'], changed['ERRORMESSAGE'], changed['ROW_ID'])]
+
+    # Update changed rows in batches, one commit (roll back every batch if one fails)
+    table_name = 'GENERATORS'
+    cur.prepare('UPDATE ' + table_name + ' SET ADDED = :1, ERRORMESSAGE = :2 WHERE ROWID = :3')
+    try:
+        for start in range(0, len(update_data), batch_size):
+            cur.executemany(None, update_data[start:start + batch_size])
+    except Exception:
+        con.rollback()
+        raise
+    con.commit()
+
+    return len(update_data)
+
+
+def fetch_generators(cur, write_mode='REPLACE', chunk_size=None, order_by=None, after=None, skip_row_ids=None):
+    """
+    Fetches pending generator rows (ADDED and ERRORMESSAGE empty) as data frames (empty values as '')
+    :param cur: Oracle cursor to CMATE Apex (not used for anything else until every chunk is fetched)
+    :param write_mode: 'REPLACE' (every column selected) or 'DELTA' (only GENERATOR_COLUMNS selected)
+    :param chunk_size: Number of rows per data frame (also cursor array size), None for one data frame of every row
+    :param order_by: Column to fetch rows in order of ('ROWID' or column of GENERATORS, other columns selected as MARK
+        column in 'DELTA' write mode), None for any order
+    :param after: Value of order_by column to fetch only rows after, None to fetch every pending row
+    :param skip_row_ids: ROWIDs of pending rows not to fetch, None to not skip rows
+    :return: Generator of data frames, with ROW_ID column (ROWID) if 'DELTA' write mode or chunked
+    """
     import pandas as pd
     import numpy as np
+    import Instrumentation
+
+    # Select ROWID as key of rows to write back if only writing changed rows or writing per chunk
+    pending = ' WHERE ADDED IS NULL AND ERRORMESSAGE IS NULL'
+    if write_mode == 'DELTA':
+        mark = '' if order_by in (None, 'ROWID') else order_by + ' AS MARK, '
+        sql = 'SELECT ROWID AS ROW_ID, ' + mark + ', '.join(GENERATOR_COLUMNS) + ' FROM GENERATORS' + pending
+    elif chunk_size is not None:
+        sql = 'SELECT ROWID AS ROW_ID, G.* FROM GENERATORS G' + pending
+    else:
+        sql = 'SELECT * FROM GENERATORS' + pending
+    parameters = []
+    if after is not None:
+        parameters.append(after)
+        sql += ' AND {} > :1'.format(order_by)
+    if skip_row_ids:
+        # Oracle lists hold at most 1000 expressions
+        skip_row_ids = list(skip_row_ids)
+        for start in range(0, len(skip_row_ids), 1000):
+            binds = []
+            for row_id in skip_row_ids[start:start + 1000]:
+                parameters.append(row_id)
+                binds.append(':' + str(len(parameters)))
+            sql += ' AND ROWID NOT IN (' + ', '.join(binds) + ')'
+    if order_by is not None:
+        sql += ' ORDER BY ' + order_by
+
+    # Fetch rows in round trips of chunk size
+    Instrumentation.mark('fetch')
+    if chunk_size is not None:
+        cur.arraysize = chunk_size
+    cur.execute(sql, parameters)
+    column_names = [column[0] for column in cur.description]
+    while True:
+        rows = cur.fetchall() if chunk_size is None else cur.fetchmany(chunk_size)
+        if not rows and chunk_size is not None:
+            break
+        gen_data = pd.DataFrame(rows, columns=column_names)
+        gen_data.replace(np.nan, '', inplace=True)
+        Instrumentation.mark(None)
+        yield gen_data
+        Instrumentation.mark('fetch')
+        if chunk_size is None:
+            break
+    Instrumentation.mark(None)
+
+
+def get_generator_config(keyword, eqid, row):
+    """
+    Gets device values of generator, template of generator type with values of row
+    :param keyword: Generator keyword ('ECG', 'SYNCHGEN', 'INDUCTGEN')
+    :param eqid: Equipment ID of generator
+    :param row: Generator row
+    :return: List of (property, value) in write order, list of device commands in execute order
+    """
+    # Equipment ID first (may change other values of device), Active Generation value per device based on data frame
+    values = [('DeviceID', eqid), ('GenerationModels[0].ActiveGeneration', row['ACTIVEGENERATION'])]
+    values += GENERATOR_TEMPLATES[keyword]
+    # If Synchronous Generator, change Desired Voltage per device based on data frame voltage
+    if keyword == 'SYNCHGEN':
+        if 'VOLTAGE' in str.upper(row['CONTROLTYPE']):
+            values += [('VoltageControlType', 'VoltageControl_VoltageControlled'), ('KVSet', row['RATEDKVLL']),
+                       # Change minimum and maximum reactance of defaulted Voltage Controlled type
+                       ('GenerationModels[0].MaxReactivePower', row['MAXREACTANCE']),
+                       ('GenerationModels[0].MinReactivePower', row['MINREACTANCE'])]
+        # Change Power Factor parameter if generator is listed as Fixed Control type in data frame
+        elif 'FIXED' in str.upper(row['CONTROLTYPE']):
+            values += [('VoltageControlType', 'VoltageControl_Fixed'),
+                       ('GenerationModels[0].PowerFactor', row['POWERFACTOR'])]
+    # If Induction Generator, change Power Factor
+    elif keyword == 'INDUCTGEN':
+        values += [('GenerationModels[0].PowerFactor', row['POWERFACTOR'])]
+
+    return values, GENERATOR_COMMANDS[keyword]
+
+
+def configure_device(section_id, device_type, values, commands):
+    """
+    Writes every value of device in order (device fetched once, each write may change later values so none are
+    skipped), then executes device commands in order
+    :param section_id: Device number
+    :param device_type: Cyme device type
+    :param values: List of (property, value) in write order
+    :param commands: List of device commands
+    :return: Number of values written
+    """
     import cympy
 
-    cur.execute('SELECT * FROM GENERATORS WHERE ADDED IS NULL AND ERRORMESSAGE IS NULL')
-    gen_data = pd.DataFrame(cur.fetchall(), columns=[column[0] for column in cur.description])
-    gen_data.replace(np.nan, '', inplace=True)
-
-    # Empty lists to extract EquipmentIDs from created Equipment object lists
-    ecg_eqids = []
-    ecg_eqs = cympy.eq.ListEquipments(cympy.enums.EquipmentType.ElectronicConverterGenerator)
-    for ecg_eq in ecg_eqs:
-        ecg_eqids.append(ecg_eq.ID)
-    sync_eqids = []
-    sync_eqs = cympy.eq.ListEquipments(cympy.enums.EquipmentType.SynchronousGenerator)
-    for sync_eq in sync_eqs:
-        sync_eqids.append(sync_eq.ID)
-    ind_eqids = []
-    ind_eqs = cympy.eq.ListEquipments(cympy.enums.EquipmentType.InductionGenerator)
-    for ind_eq in ind_eqs:
-        ind_eqids.append(ind_eq.ID)
-    # Dictionary of generator lists to be used for Equipment IDs
-    gen_eqids = {'ECG': ecg_eqids, 'SYNCHGEN': sync_eqids, 'INDUCTGEN': ind_eqids}
-    # Grab device types, number of generators in network to use as index for section/device name
-    gen_number = len(cympy.study.ListDevices(cympy.enums.DeviceType.ElectronicConverterGenerator)) + \
-        len(cympy.study.ListDevices(cympy.enums.DeviceType.SynchronousGenerator)) + \
-        len(cympy.study.ListDevices(cympy.enums.DeviceType.InductionGenerator))
-    # Iterate through data frame to collect generator information
-    for i, row in gen_data.iterrows():
-        try:
-            # Perform checks on input data
-            # If Generator Type not equal to 'ECG', 'INDUCTION', or 'SYNCHRONOUS'
-            if (row['GENERATORTYPE'] != 'ECG') and (row['GENERATORTYPE'] != 'INDUCTION') and \
-                    (row['GENERATORTYPE'] != 'SYNCHRONOUS'):
-                gen_data.at[i, 'ERRORMESSAGE'] = 'Incorrect generator type.'
-                continue
-            # Check if value for node is empty
-            if row['NODE'] == '':
-                gen_data.at[i, 'ERRORMESSAGE'] = 'Missing node.'
-                continue
-            # Check if node is in the circuit, if not then just go to next gen (will try on another circuit)
-            node = cympy.study.GetNode(row['NODE'])
-            if node is None:
-                continue
-            # Compare Cyme and data frame voltages, row skipped if they do not match
-            node_voltage = float(cympy.study.QueryInfoNode('KVLLBase', row['NODE']))
-            if node_voltage != row['RATEDKVLL']:
-                gen_data.at[i, 'ERRORMESSAGE'] = 'Node voltage incorrect.'
-                continue
-            # Check active generation
-            if row['ACTIVEGENERATION'] == '':
-                gen_data.at[i, 'ERRORMESSAGE'] = 'Missing active generation.'
-                continue
+    device = cympy.study.GetDevice(section_id, device_type)
+    for name, value in values:
+        device.SetValue(value, name)
+    for command in commands:
+        device.Execute(command)
 
-            # If induction generator, check for power factor, ensure it's between 0 and 100
-            if row['GENERATORTYPE'] == 'INDUCTION':
-                if (row['POWERFACTOR'] == '') or (int(row['POWERFACTOR'] < 0)) or (int(row['POWERFACTOR']) > 100):
-                    gen_data.at[i, 'ERRORMESSAGE'] = 'Incorrect power factor.'
-                    continue
+    return len(values)
 
-            # If synchronous generator, check control type for fixed or voltage
-            if row['GENERATORTYPE'] == 'SYNCHRONOUS':
-                if (row['CONTROLTYPE'] != 'Fixed_Generation') and (row['CONTROLTYPE'] != 'Voltage_Controlled'):
-                    gen_data.at[i, 'ERRORMESSAGE'] = 'Incorrect control type.'
-                    continue
-                else:
-                    if row['CONTROLTYPE'] == 'Fixed_Generation':
-                        if (row['POWERFACTOR'] == '') or (int(row['POWERFACTOR'] < 0)) or (
-                                int(row['POWERFACTOR']) > 100):
-                            gen_data.at[i, 'ERRORMESSAGE'] = 'Incorrect power factor.'
-                            continue
-                    else:
-                        if (row['MAXREACTANCE'] == '') or (row['MINREACTANCE'] == '') or \
-                                (int(row['MAXREACTANCE']) < int(row['MINREACTANCE'])):
-                            gen_data.at[i, 'ERRORMESSAGE'] = 'Incorrect min/max reactance.'
-                            continue
-
-            # Check to see if generator already added
-            if row['ADDED'] == '':
-                gen_data.at[i, 'ADDED'] = 1
-            # Else (generator already added), skip
-            else:
-                gen_data.at[i, 'ERRORMESSAGE'] = 'Generator already added.'
-                continue
+
+def place_generators(gen_data, node_data, valid, registry):
+    """
+    Adds section and generator device for every valid row (sets ERRORMESSAGE of rows of unknown type and rows
+    Cyme fails to add or configure)
+    :param gen_data: Generator data frame
+    :param node_data: Node index joined to rows of data frame (KVLLBASE, NETWORKID, X, Y)
+    :param valid: Mask of valid rows from validate_generators
+    :param registry: GeneratorRegistry of loaded study (equipment and generators added are registered)
+    :return: List of section IDs added
+    """
+    import cympy
+
+    section_ids = []
+    # Iterate through valid rows of data frame to collect generator information
+    for i, row in gen_data[valid].iterrows():
+        section_added = False
+        try:
+            node = node_data.loc[i]
+            node_voltage = node['KVLLBASE']
 
             # Assign variables for Electronic Converter Generators
             if 'ELECTRONIC' in str.upper(row['GENERATORTYPE']) or 'ECG' in str.upper(row['GENERATORTYPE']):
@@ -110,12 +350,12 @@ def create_generator(con, cur):
                 gen_data.at[i, 'ERRORMESSAGE'] = 'Generation type unknown.'
                 continue
 
-            # Increment number of Generators in circuit for each iteration
-            gen_number += 1
+            # Number of Generators in circuit once this one is added (only registered once its section is added)
+            gen_number = registry.gen_number + 1
             # Define Section and Device variables to use in naming conventions
             section_id = row['NODE'] + '_GEN-' + str(gen_number)
             # Grab Network ID  from each individual node
-            circuit_name = cympy.study.QueryInfoNode('NetworkId', row['NODE'])
+            circuit_name = node['NETWORKID']
             # Grab data frame node to acquire coordinates for to node function to add section
             to_node = cympy.study.Node()
             to_node.ID = circuit_name + '_' + str(row['NODE']) + '_GEN-' + str(gen_number)
@@ -123,92 +363,840 @@ def create_generator(con, cur):
             to_node.Y = node.Y + 20
             # Add section containing generator to node listed on data frame
             cympy.study.AddSection(section_id, circuit_name, section_id, device_type, row['NODE'], to_node)
+            registry.next_number()
+            section_ids.append(section_id)
+            section_added = True
 
             # Assign Equipment ID variable based on type of Generator and voltage
             eqid = keyword + '_' + str(node_voltage) + 'KV'
-            # If EquipmentID not in list of equipment, add to list, create EquipmentID, and assign values to properties
-            if eqid not in gen_eqids[keyword]:
-                gen_eqids[keyword].append(eqid)
+            # If EquipmentID not in registry, add to registry, create EquipmentID, and assign values to properties
+            if registry.add_equipment(keyword, eqid):
                 cympy.eq.Add(keyword + '_' + str(node_voltage) + 'KV', gen_type)
                 # Change EquipmentID properties for apparent power, voltage, and power factor
                 cympy.eq.SetValue(1000, 'RatedKVA', eqid, gen_type)
                 cympy.eq.SetValue(node_voltage, 'RatedKVLL', eqid, gen_type)
                 cympy.eq.SetValue(100, 'PFPercent', eqid, gen_type)
                 # If generator is ECG type, change Active generation value
-                if keyword is 'ECG':
+                if keyword == 'ECG':
                     cympy.eq.SetValue(1000, 'ActiveGeneration', eqid, gen_type)
                 # If generator is Induction type, changge Active Generation value. Different ID than ECG
-                elif keyword is 'INDUCTGEN':
+                elif keyword == 'INDUCTGEN':
                     cympy.eq.SetValue(1000, 'ActiveGenerationKW', eqid, gen_type)
                 # Note: Active Generation for Synchronous Generators does not need to be assigned on EquipmentID
                 # because will be set with kVA and power factor
 
-            # Assign equipment ID to device if already exists
-            cympy.study.SetValueDevice(eqid, 'DeviceID', section_id, device_type)
-            # Assign Active Generation value per device based on data frame
-            cympy.study.SetValueDevice(row['ACTIVEGENERATION'], 'GenerationModels[0].ActiveGeneration',
-                                       section_id, device_type)
-            # If ECG type, change Inverter ratings for KVA, KW, KVAR, and Inverter Control PowerFactor to 100%
-            if keyword is 'ECG':
-                cympy.study.SetValueDevice(1000, 'Inverter.ConverterRating', section_id, device_type)
-                cympy.study.SetValueDevice(1000, 'Inverter.ActivePowerRating', section_id, device_type)
-                cympy.study.SetValueDevice(1000, 'Inverter.ReactivePowerRating', section_id, device_type)
-                generator = cympy.study.GetDevice(section_id, device_type)
-                generator.Execute('Inverter.InverterControls[0].SetType(ConverterControlVoltVarVV11)')
-                generator.Execute('Inverter.InverterControls[0].SetType(ConverterControlPowerFactor)')
-            # If Synchronous Generator, change Desired Voltage per device based on data frame voltage
-            elif keyword is 'SYNCHGEN':
-                if 'VOLTAGE' in str.upper(row['CONTROLTYPE']):
-                    cympy.study.SetValueDevice('VoltageControl_VoltageControlled', 'VoltageControlType',
-                                               section_id, device_type)
-                    cympy.study.SetValueDevice(row['RATEDKVLL'], 'KVSet', section_id, device_type)
-                    # Change minimum and maximum reactance of defaulted Voltage Controlled type
-                    cympy.study.SetValueDevice(row['MAXREACTANCE'], 'GenerationModels[0].MaxReactivePower',
-                                               section_id, device_type)
-                    cympy.study.SetValueDevice(row['MINREACTANCE'], 'GenerationModels[0].MinReactivePower',
-                                               section_id, device_type)
-                # Change Power Factor parameter if generator is listed as Fixed Control type in data frame
-                elif 'FIXED' in str.upper(row['CONTROLTYPE']):
-                    cympy.study.SetValueDevice('VoltageControl_Fixed', 'VoltageControlType', section_id, device_type)
-                    cympy.study.SetValueDevice(row['POWERFACTOR'], 'GenerationModels[0].PowerFactor',
-                                               section_id, device_type)
-            # If Induction Generator, change Power Factor
-            elif keyword is 'INDUCTGEN':
-                cympy.study.SetValueDevice(row['POWERFACTOR'], 'GenerationModels[0].PowerFactor',
-                                           section_id, device_type)
+            # Assign equipment ID, generation and control values to device in one grouped write
+            values, commands = get_generator_config(keyword, eqid, row)
+            configure_device(section_id, device_type, values, commands)
 
+        # Report error on row, row only stays added if its section was added
         except cympy.err.CymError as e:
-            print(e.GetMessage())
+            gen_data.at[i, 'ERRORMESSAGE'] = e.GetMessage()
+            if not section_added:
+                gen_data.at[i, 'ADDED'] = ''
 
-    # Write table to SQL
-    table_name = 'GENERATORS'
-    column_names = gen_data.columns
-    gen_data = gen_data.astype(str)
-    insert_data = gen_data.values.tolist()
-    del gen_data
+    return section_ids
 
-    # Clear existing results in table for given circuit
-    sql = 'DELETE FROM ' + table_name + ' WHERE ADDED IS NULL AND ERRORMESSAGE IS NULL'
-    cur.execute(sql)
-    con.commit()
 
-    # Insert new results
-    sql = 'INSERT INTO ' + table_name + ' (' + ', '.join(column_names) + ') VALUES ('
-    for col_number in range(1, len(column_names) + 1):
-        if col_number != 1:
-            sql += ', '
-        sql += ':' + str(col_number)
-    sql += ')'
+class GeneratorRegistry(object):
+    """
+    Generator equipment IDs (set per generator keyword) and number of generators of loaded study, kept up to date as
+    equipment and generators are added, optional JSON snapshot per study file (used while study file modification
+    time and size match, so repeated runs skip listing equipment and devices)
+    """
 
-    cur.prepare(sql)
-    cur.executemany(None, insert_data)
-    con.commit()
+    def __init__(self, study_file=None, snapshot_dir=None):
+        """
+        Loads snapshot of study if valid, otherwise lists equipment and devices of loaded study
+        :param study_file: Study file string of loaded study (None for no snapshot)
+        :param snapshot_dir: Directory of snapshot files (None for no snapshot)
+        """
+        self.eqids = {}
+        self.gen_number = 0
+        self.snapshot_file = None
+        if study_file is not None and snapshot_dir is not None:
+            import os
+            self.snapshot_file = os.path.join(snapshot_dir, os.path.basename(study_file) + '.generators.json')
+            if self.load(study_file):
+                return
+        self.enumerate()
+
+    def enumerate(self):
+        """
+        Lists generator equipment and devices of loaded study
+        """
+        import cympy
+
+        # Sets of Equipment IDs of each generator type to be used for Equipment IDs
+        self.eqids = {keyword: set(eq.ID for eq in cympy.eq.ListEquipments(gen_type))
+                      for keyword, gen_type in (('ECG', cympy.enums.EquipmentType.ElectronicConverterGenerator),
+                                                ('SYNCHGEN', cympy.enums.EquipmentType.SynchronousGenerator),
+                                                ('INDUCTGEN', cympy.enums.EquipmentType.InductionGenerator))}
+        # Grab device types, number of generators in network to use as index for section/device name
+        self.gen_number = len(cympy.study.ListDevices(cympy.enums.DeviceType.ElectronicConverterGenerator)) + \
+            len(cympy.study.ListDevices(cympy.enums.DeviceType.SynchronousGenerator)) + \
+            len(cympy.study.ListDevices(cympy.enums.DeviceType.InductionGenerator))
+
+    def add_equipment(self, keyword, eqid):
+        """
+        Registers equipment ID
+        :param keyword: Generator keyword ('ECG', 'SYNCHGEN', 'INDUCTGEN')
+        :param eqid: Equipment ID
+        :return: Bool True if equipment ID is new (equipment must be added to study), False if already registered
+        """
+        if eqid in self.eqids[keyword]:
+            return False
+        self.eqids[keyword].add(eqid)
+        return True
+
+
+    def next_number(self):
+        """
+        Registers generator
+        :return: Number of generator (number of generators in study after it is added)
+        """
+        self.gen_number += 1
+        return self.gen_number
+
+    @staticmethod
+    def study_key(study_file):
+        """
+        Gets key snapshot is valid for
+        :param study_file: Study file string
+        :return: List of absolute path, modification time, size of study file
+        """
+        import os
+
+        stat = os.stat(study_file)
+        return [os.path.abspath(study_file), stat.st_mtime, stat.st_size]
+
+    def load(self, study_file):
+        """
+        Loads snapshot if it exists and matches study file
+        :param study_file: Study file string
+        :return: Bool True if snapshot loaded
+        """
+        import json
+        import os
+
+        if not os.path.isfile(self.snapshot_file):
+            return False
+        with open(self.snapshot_file) as snapshot:
+            data = json.load(snapshot)
+        if data.get('STUDY') != self.study_key(study_file):
+            return False
+        self.eqids = {keyword: set(eqids) for keyword, eqids in data['EQUIPMENT'].items()}
+        self.gen_number = data['GENNUMBER']
+        return True
+
+    def save(self, study_file):
+        """
+        Writes snapshot of registry (call after study is saved, snapshot only valid for saved study file)
+        :param study_file: Study file string
+        :return: None
+        """
+        import json
+
+        if self.snapshot_file is None:
+            return None
+        data = {'STUDY': self.study_key(study_file),
+                'EQUIPMENT': {keyword: sorted(eqids) for keyword, eqids in self.eqids.items()},
+                'GENNUMBER': self.gen_number}
+        with open(self.snapshot_file, 'w') as snapshot:
+            json.dump(data, snapshot)
+        return None
+
+
+class GeneratorPlacer(object):
+    """
+    Places generator rows on loaded study, study nodes, node index and generator registry kept between data frames
+    (chunks of one run, batches of daemon)
+    """
+
+    def __init__(self, registry=None, study_nodes=None):
+        """
+        Gets equipment IDs, number of generators and nodes of loaded study
+        :param registry: GeneratorRegistry of loaded study, None to list equipment and devices of study
+        :param study_nodes: Dictionary of node ID to node from get_study_nodes, None to list nodes of study
+        """
+        # Equipment IDs and number of generators in study
+        self.registry = GeneratorRegistry() if registry is None else registry
+        self.study_nodes = get_study_nodes() if study_nodes is None else study_nodes
+        self.node_index = None
+        # Section IDs added by last data frame placed
+        self.section_ids = []
+
+    def place(self, gen_data):
+        """
+        Checks rows, adds generators of valid rows, sets ADDED and ERRORMESSAGE of rows
+        :param gen_data: Generator data frame
+        :return: Boolean series of rows that passed every rule
+        """
+        import pandas as pd
+        import Instrumentation
+
+        # Index nodes of rows not indexed yet (queried once over every data frame), join to rows (NaN if not in circuit)
+        Instrumentation.mark('validate')
+        if self.node_index is None:
+            self.node_index = get_node_index(gen_data['NODE'], self.study_nodes)
+        else:
+            new_nodes = gen_data.loc[~gen_data['NODE'].isin(self.node_index.index), 'NODE']
+            if len(new_nodes):
+                self.node_index = pd.concat([self.node_index, get_node_index(new_nodes, self.study_nodes)])
+        node_data = gen_data[['NODE']].join(self.node_index, on='NODE')
+        # Check all rows at once (rows with node not in circuit dropped), mark valid rows as added
+        valid = validate_generators(gen_data, node_data['KVLLBASE'])
+        gen_data.loc[valid, 'ADDED'] = 1
+        Instrumentation.mark('place')
+        self.section_ids = place_generators(gen_data, node_data, valid, self.registry)
+        Instrumentation.mark(None)
+
+        return valid
+
+
+class GeneratorCheckpoint(object):
+    """
+    Progress of checkpointed run on study, JSON file per study file: high-water mark (ROWID of last row of last
+    committed batch, restarted run fetches rows after it) and batch in flight (results and section IDs added of placed
+    batch, recorded before study is saved and batch committed)
+    """
+
+    def __init__(self, study_file, checkpoint_dir):
+        """
+        Loads checkpoint of study if it exists
+        :param study_file: Study file string of loaded study
+        :param checkpoint_dir: Directory of checkpoint files
+        """
+        import os
+
+        self.checkpoint_file = os.path.join(checkpoint_dir, os.path.basename(study_file) + '.checkpoint.json')
+        self.row_id = None
+        self.batches = 0
+        self.rows = 0
+        self.inflight = None
+        self.load()
+
+    def load(self):
+        """
+        Loads checkpoint file if it exists
+        :return: Bool True if checkpoint loaded
+        """
+        import json
+        import os
+
+        if not os.path.isfile(self.checkpoint_file):
+            return False
+        with open(self.checkpoint_file) as checkpoint:
+            data = json.load(checkpoint)
+        self.row_id = data['ROWID']
+        self.batches = data['BATCHES']
+        self.rows = data['ROWS']
+        self.inflight = data['INFLIGHT']
+        return True
+
+    def save(self):
+        """
+        Writes checkpoint file (written to temporary file first, so crash while writing keeps last checkpoint)
+        :return: None
+        """
+        import json
+        import os
+
+        data = {'ROWID': self.row_id, 'BATCHES': self.batches, 'ROWS': self.rows, 'INFLIGHT': self.inflight}
+        os.makedirs(os.path.dirname(self.checkpoint_file) or '.', exist_ok=True)
+        with open(self.checkpoint_file + '.tmp', 'w') as checkpoint:
+            json.dump(data, checkpoint)
+        os.replace(self.checkpoint_file + '.tmp', self.checkpoint_file)
+
+    def begin(self, gen_data, section_ids):
+        """
+        Records placed batch as in flight (call before study is saved)
+        :param gen_data: Placed generator data frame with ROW_ID column
+        :param section_ids: List of section IDs added by batch
+        :return: None
+        """
+        self.inflight = {'SECTIONS': list(section_ids),
+                         'ROWS': [[row_id, '' if added == '' else int(added), str(message)] for row_id, added, message
+                                  in zip(gen_data['ROW_ID'].tolist(), gen_data['ADDED'], gen_data['ERRORMESSAGE'])]}
+        self.save()
+
+    def commit(self, gen_data):
+        """
+        Records committed batch, high-water mark moved to last row of batch (rows fetched in ROWID order)
+        :param gen_data: Committed generator data frame with ROW_ID column
+        :return: None
+        """
+        self.row_id = gen_data['ROW_ID'].tolist()[-1]
+        self.batches += 1
+        self.rows += len(gen_data)
+        self.inflight = None
+        self.save()
+
+    @staticmethod
+    def has_section(section_id):
+        """
+        Checks if loaded study has section
+        :param section_id: Section ID
+        :return: Bool
+        """
+        import cympy
+
+        try:
+            return cympy.study.GetSection(section_id) is not None
+        except cympy.err.CymError:
+            return False
+
+    def recover(self, con, cur, batch_size=1000):
+        """
+        Finishes batch in flight of interrupted run: commits its results if study was saved after it was placed
+        (loaded study has every section batch added, or batch added no sections), otherwise drops it (rows still
+        pending, fetched and placed again)
+        :param con: Oracle connection to CMATE Apex
+        :param cur: Oracle cursor to CMATE Apex
+        :param batch_size: Number of rows per update batch
+        :return: Number of rows committed
+        """
+        import pandas as pd
+
+        if self.inflight is None:
+            return 0
+        gen_data = pd.DataFrame(self.inflight['ROWS'], columns=['ROW_ID', 'ADDED', 'ERRORMESSAGE'])
+        if all(self.has_section(section_id) for section_id in self.inflight['SECTIONS']):
+            write_generators_delta(con, cur, gen_data, batch_size)
+            self.commit(gen_data)
+            return len(gen_data)
+        self.inflight = None
+        self.save()
+        return 0
+
+    def clear(self):
+        """
+        Removes checkpoint file (queue done, next run starts from first pending row)
+        :return: None
+        """
+        import os
+
+        if os.path.isfile(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        self.row_id = None
+        self.batches = 0
+        self.rows = 0
+        self.inflight = None
+
+
+def write_generators(con, cur, gen_data, write_mode='REPLACE', batch_size=1000):
+    """
+    Writes generator rows back in given write mode
+    :param con: Oracle connection to CMATE Apex
+    :param cur: Oracle cursor to CMATE Apex
+    :param gen_data: Generator data frame
+    :param write_mode: 'REPLACE' or 'DELTA'
+    :param batch_size: Number of rows per update batch in 'DELTA' write mode
+    :return: None
+    """
+    import Instrumentation
+
+    Instrumentation.mark('write')
+    if write_mode == 'DELTA':
+        write_generators_delta(con, cur, gen_data, batch_size)
+    else:
+        write_generators_replace(con, cur, gen_data)
+    Instrumentation.mark(None)
+
+
+class ConnectionPool(object):
+    """
+    Oracle connections to CMATE Apex opened with a connect function and kept open between uses, one connection per
+    user at a time (connections aren't shared between threads), connections that failed are closed instead of
+    returned to pool
+    """
+
+    def __init__(self, connect, size=2):
+        """
+        Creates empty pool (connections opened on first use)
+        :param connect: Function returning new (connection, cursor), e.g. lambda: Support.oracle_conn('CMATE')
+        :param size: Number of idle connections kept open
+        """
+        import threading
+
+        self.connect = connect
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes idle connection, opens new one if none idle
+        :return: Oracle connection, Oracle cursor
+        """
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return self.connect()
+
+    def release(self, con, cur, failed=False):
+        """
+        Returns connection to pool (closed if it failed or pool is full)
+        :param con: Oracle connection from acquire
+        :param cur: Oracle cursor from acquire
+        :param failed: Bool True if connection raised an error while used
+        :return: None
+        """
+        with self.lock:
+            if not failed and len(self.idle) < self.size:
+                self.idle.append((con, cur))
+                return None
+        try:
+            cur.close()
+            con.close()
+        except Exception:
+            pass
+        return None
+
+    def connection(self):
+        """
+        Context manager taking a connection for the with block (released as failed if block raises)
+        :return: Context manager yielding (connection, cursor)
+        """
+        import contextlib
+
+        @contextlib.contextmanager
+        def pooled():
+            con, cur = self.acquire()
+            try:
+                yield con, cur
+            except BaseException:
+                self.release(con, cur, failed=True)
+                raise
+            self.release(con, cur)
+
+        return pooled()
+
+    def close(self):
+        """
+        Closes idle connections
+        :return: None
+        """
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for con, cur in idle:
+            cur.close()
+            con.close()
+
+
+def place_generators_pipelined(cur, placer, pool, write_mode='REPLACE', batch_size=1000, chunk_size=1000):
+    """
+    Places chunks of pending rows on this thread while next chunk is fetched on a fetch thread and placed chunks are
+    written back on a writer thread with own connection from pool (cympy only called from this thread, each
+    connection only used by one thread, so fetch and write round trips overlap)
+    :param cur: Oracle cursor to CMATE Apex (used by fetch thread)
+    :param placer: GeneratorPlacer of loaded study
+    :param pool: ConnectionPool writer thread takes its connection from
+    :param write_mode: 'REPLACE' or 'DELTA'
+    :param batch_size: Number of rows per update batch in 'DELTA' write mode
+    :param chunk_size: Number of rows per chunk
+    :return: Number of rows
+    """
+    import concurrent.futures
+    import queue
+    import threading
+    import Instrumentation
+
+    chunks = fetch_generators(cur, write_mode, chunk_size)
+    # Placed chunks waiting to be written (bounded so fetching doesn't run far ahead of writing)
+    write_queue = queue.Queue(maxsize=2)
+    write_errors = []
+
+    def write_chunks():
+        pooled = None
+        failed = False
+        try:
+            pooled = pool.acquire()
+            write_con, write_cur = pooled
+            # Time writer connection's calls too when profiling
+            if Instrumentation.PROFILER is not None:
+                write_con, write_cur = Instrumentation.PROFILER.wrap_connection(write_con, write_cur)
+        except Exception as e:
+            write_errors.append(e)
+        try:
+            # Write chunks until None, keep taking chunks after error so placing isn't blocked
+            while True:
+                gen_data = write_queue.get()
+                if gen_data is None:
+                    break
+                if not write_errors:
+                    try:
+                        write_generators(write_con, write_cur, gen_data, write_mode, batch_size)
+                    except Exception as e:
+                        failed = True
+                        write_errors.append(e)
+        finally:
+            if pooled is not None:
+                pool.release(pooled[0], pooled[1], failed)
+
+    writer = threading.Thread(target=write_chunks, daemon=True)
+    writer.start()
+    rows = 0
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as fetcher:
+            next_chunk = fetcher.submit(next, chunks, None)
+            while True:
+                gen_data = next_chunk.result()
+                if gen_data is None or write_errors:
+                    break
+                # Fetch next chunk while this chunk is placed
+                next_chunk = fetcher.submit(next, chunks, None)
+                placer.place(gen_data)
+                write_queue.put(gen_data)
+                rows += len(gen_data)
+    finally:
+        write_queue.put(None)
+        writer.join()
+    if write_errors:
+        raise write_errors[0]
+
+    return rows
+
+
+def place_generators_checkpointed(con, cur, placer, study_file, checkpoint_dir, batch_size=1000, chunk_size=1000):
+    """
+    Places pending rows in batches fetched in ROWID order, after each batch saves study, commits batch's updates and
+    moves checkpoint high-water mark (restarted run finishes batch in flight, then fetches only rows after mark
+    instead of checking and placing whole backlog again), checkpoint removed once every batch is committed
+    :param con: Oracle connection to CMATE Apex
+    :param cur: Oracle cursor to CMATE Apex (used to fetch rows)
+    :param placer: GeneratorPlacer of loaded study
+    :param study_file: Study file string of loaded study (saved after each batch with generators added)
+    :param checkpoint_dir: Directory of checkpoint files
+    :param batch_size: Number of rows per update batch
+    :param chunk_size: Number of rows per checkpointed batch
+    :return: Number of rows committed by this run and runs it resumed
+    """
+    import cympy
+
+    registry = placer.registry
+    checkpoint = GeneratorCheckpoint(study_file, checkpoint_dir)
+    checkpoint.recover(con, cur, batch_size)
+    if checkpoint.batches:
+        print('Resuming after {} batches ({} rows)'.format(checkpoint.batches, checkpoint.rows))
+
+    # Write batches with another cursor while rows are still being fetched
+    write_cur = con.cursor()
+    try:
+        for gen_data in fetch_generators(cur, 'DELTA', chunk_size, order_by='ROWID', after=checkpoint.row_id):
+            valid = placer.place(gen_data)
+
+            # Record batch before saving study, so restart can tell whether study has batch's sections
+            checkpoint.begin(gen_data, placer.section_ids)
+            if valid.any():
+                cympy.study.Save(study_file)
+                registry.save(study_file)
+            write_generators(con, write_cur, gen_data, 'DELTA', batch_size)
+            checkpoint.commit(gen_data)
+    finally:
+        write_cur.close()
+
+    rows = checkpoint.rows
+    checkpoint.clear()
+    return rows
+
+
+def create_generator(con, cur, write_mode='REPLACE', batch_size=1000, chunk_size=None, pipeline=False,
+                     registry=None, profile_file=None, sample_every=1, study_file=None, checkpoint_dir=None, pool=None):
+    """
+    Add generators to circuit
+    :param con: Oracle connection to CMATE Apex
+    :param cur: Oracle cursor to CMATE Apex
+    :param write_mode: 'REPLACE' (delete pending rows, insert all rows again) or
+        'DELTA' (update only rows that got ADDED or ERRORMESSAGE set)
+    :param batch_size: Number of rows per update batch in 'DELTA' write mode
+    :param chunk_size: Number of rows fetched, validated, placed and written back at a time,
+        None to fetch every pending row at once
+    :param pipeline: Bool to fetch next chunk and write placed chunks on other threads while placing
+        (needs chunk_size and pool)
+    :param registry: GeneratorRegistry of loaded study, None to list equipment and devices of study
+    :param profile_file: JSON file path to write run profile to (cympy and database calls, phases),
+        None to not profile
+    :param sample_every: Time every n-th call of each cympy and database function when profiling
+    :param study_file: Study file string of loaded study (needed for checkpoints)
+    :param checkpoint_dir: Directory of checkpoint files to commit and save study after every chunk and resume
+        interrupted run from (needs study_file, chunk_size and 'DELTA' write mode), None for no checkpoints
+    :param pool: ConnectionPool to take pipeline's writer connection from
+    :return: None
+    """
+    import Instrumentation
+
+    with Instrumentation.profiling(profile_file, sample_every) as profiler:
+        # Time database calls too
+        if profiler is not None:
+            con, cur = profiler.wrap_connection(con, cur)
+
+        placer = GeneratorPlacer(registry)
+        if checkpoint_dir is not None:
+            if study_file is None or chunk_size is None or write_mode != 'DELTA':
+                raise ValueError('Checkpoints need study file, chunk size and DELTA write mode')
+            place_generators_checkpointed(con, cur, placer, study_file, checkpoint_dir, batch_size, chunk_size)
+            return None
+        if pipeline:
+            if chunk_size is None or pool is None:
+                raise ValueError('Pipeline needs chunk size and connection pool')
+            place_generators_pipelined(cur, placer, pool, write_mode, batch_size, chunk_size)
+            return None
+
+        # Write chunks with another cursor while rows are still being fetched
+        write_cur = cur if chunk_size is None else con.cursor()
+        for gen_data in fetch_generators(cur, write_mode, chunk_size):
+            placer.place(gen_data)
+
+            # Write table (or chunk) to SQL
+            write_generators(con, write_cur, gen_data, write_mode, batch_size)
+        if write_cur is not cur:
+            write_cur.close()
     return None
 
 
+def run_daemon(pool, study_file=None, poll_interval=5.0, max_interval=60.0, batch_size=1000, max_batches=None,
+               snapshot_dir=None, mark_column=None):
+    """
+    Keeps study and a pooled connection open, polls GENERATORS for pending rows and adds generators of each batch of
+    new rows (rows written back with delta updates)
+    Rows with node not in study stay pending (for another circuit) and aren't fetched again: polls either only fetch
+    rows past mark column value of last row fetched, or exclude ROWIDs of rows skipped before in query
+    (ROWIDs aren't used as mark, as Oracle reuses free space for new rows)
+    :param pool: ConnectionPool of Oracle connections to CMATE Apex (connection kept between polls, connection that
+        fails to connect or fetch replaced on next poll)
+    :param study_file: Study file string to load once (saved after each batch with generators added),
+        None to use loaded study
+    :param poll_interval: Seconds between polls after a batch
+    :param max_interval: Maximum seconds between polls, interval doubled after each poll without new rows
+    :param batch_size: Number of rows per update batch
+    :param max_batches: Number of batches to process before returning, None to run until interrupted
+    :param snapshot_dir: Directory of generator registry snapshots (needs study_file), None for no snapshot
+    :param mark_column: Column of GENERATORS that only increases with inserts (e.g. ID from a sequence or insert
+        timestamp, rows committed in column order), None to exclude skipped rows by ROWID (query grows with rows
+        skipped)
+    :return: List of (rows, rows added, seconds) of each batch
+    """
+    import time
+    import cympy
+
+    if study_file is not None:
+        cympy.study.Open(study_file)
+    registry = GeneratorRegistry(study_file, snapshot_dir)
+    placer = GeneratorPlacer(registry)
+    # Mark column value of last row fetched, ROWIDs of rows with node not in study (stay pending for another circuit)
+    mark = None
+    skipped = set()
+    latencies = []
+    interval = poll_interval
+
+    try:
+        while max_batches is None or len(latencies) < max_batches:
+            con = None
+            try:
+                con, cur = pool.acquire()
+                if mark_column is None:
+                    gen_data = next(fetch_generators(cur, 'DELTA', skip_row_ids=skipped))
+                else:
+                    gen_data = next(fetch_generators(cur, 'DELTA', order_by=mark_column, after=mark))
+            except Exception as e:
+                # Nothing placed yet, drop connection (if connected) and reconnect on next poll
+                if con is not None:
+                    pool.release(con, cur, failed=True)
+                print('Fetch failed, reconnecting: {}'.format(e))
+                time.sleep(interval)
+                interval = min(interval * 2, max_interval)
+                continue
+            if mark_column is not None and not gen_data.empty:
+                mark = gen_data['MARK'].tolist()[-1]
+                gen_data = gen_data.drop(columns='MARK')
+            if gen_data.empty:
+                pool.release(con, cur)
+                # Back off while queue is empty
+                time.sleep(interval)
+                interval = min(interval * 2, max_interval)
+                continue
+
+            start_time = time.perf_counter()
+            valid = placer.place(gen_data)
+            try:
+                write_generators_delta(con, cur, gen_data, batch_size)
+            except Exception:
+                # Generators already placed, stop instead of placing rows again
+                pool.release(con, cur, failed=True)
+                raise
+            pool.release(con, cur)
+            if mark_column is None:
+                skipped.update(gen_data.loc[(gen_data['ADDED'] == '') & (gen_data['ERRORMESSAGE'] == ''), 'ROW_ID'])
+            if study_file is not None and valid.any():
+                cympy.study.Save(study_file)
+                registry.save(study_file)
+            latencies.append((len(gen_data), int(valid.sum()), time.perf_counter() - start_time))
+            print('{} rows, {} added ({:.2f} s)'.format(*latencies[-1]))
+
+            interval = poll_interval
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if study_file is not None:
+            cympy.study.Close(False)
+
+    return latencies
+
+
+def place_study_worker(study_file, node_ids, snapshot_dir, pipe):
+    """
+    Loads study once, sends which of given nodes are in study, receives rows routed to study, adds their generators,
+    saves study and sends results (runs in batch worker process)
+    Messages sent to create_generator_batch: ('NODES', list of given node IDs in study),
+    ('RESULTS', data frame of ADDED and ERRORMESSAGE of routed rows), ('ERROR', message) if study fails
+    :param study_file: Study file string
+    :param node_ids: List of node IDs of pending rows
+    :param snapshot_dir: Directory of generator registry snapshots, None for no snapshot
+    :param pipe: Worker end of pipe to create_generator_batch
+    :return: None
+    """
+    import cympy
+
+    try:
+        cympy.study.Open(study_file)
+        try:
+            study_nodes = get_study_nodes()
+            pipe.send(('NODES', [node_id for node_id in node_ids if node_id in study_nodes]))
+
+            # Rows with node in study and in no earlier study (study not saved if none)
+            gen_data = pipe.recv()
+            if len(gen_data):
+                registry = GeneratorRegistry(study_file, snapshot_dir)
+                GeneratorPlacer(registry, study_nodes).place(gen_data)
+                cympy.study.Save(study_file)
+                registry.save(study_file)
+            pipe.send(('RESULTS', gen_data[['ADDED', 'ERRORMESSAGE']]))
+        finally:
+            cympy.study.Close(False)
+    except Exception as e:
+        message = e.GetMessage() if isinstance(e, cympy.err.CymError) else '{}: {}'.format(type(e).__name__, e)
+        try:
+            pipe.send(('ERROR', message))
+        except OSError:
+            pass
+    finally:
+        pipe.close()
+
+
+def create_generator_batch(con, cur, studies, workers=None, write_mode='DELTA', batch_size=1000, snapshot_dir=None):
+    """
+    Adds generators of every pending row to the study its node is in, rows fetched, routed and written back once
+    (each study loaded once by a worker process that reports its nodes, then places rows routed to it)
+    Rows are routed to a study once every earlier study has reported its nodes, rows of a study that fails stay
+    pending (study not saved), results of other studies are still written back
+    :param con: Oracle connection to CMATE Apex
+    :param cur: Oracle cursor to CMATE Apex
+    :param studies: List of study files (node in more than one study is routed to the first)
+    :param workers: Number of worker processes (None for number of CPUs)
+    :param write_mode: 'DELTA' (update only rows that got ADDED or ERRORMESSAGE set) or
+        'REPLACE' (delete pending rows, insert all rows again)
+    :param batch_size: Number of rows per update batch in 'DELTA' write mode
+    :param snapshot_dir: Directory of generator registry snapshots, None for no snapshot
+    :return: Dictionary of study file to number of rows routed to study,
+        dictionary of failed study file to error message
+    """
+    import multiprocessing
+    import multiprocessing.connection
+    import os
+    import pandas as pd
+    import numpy as np
+
+    gen_data = next(fetch_generators(cur, write_mode))
+    pending_nodes = [node_id for node_id in pd.unique(gen_data['NODE']) if node_id != '']
+    workers = os.cpu_count() if workers is None else workers
+    # Node to study index (studies in given order)
+    node_study = {}
+    study_rows = {}
+    failed = {}
+    # Study position to (process, pipe) of running workers, node IDs reported by studies
+    running = {}
+    study_nodes = {}
+    started = 0
+    routed = 0
+
+    try:
+        while routed < len(studies) or running:
+            # Start workers in study order
+            while started < len(studies) and len(running) < workers:
+                pipe, worker_pipe = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=place_study_worker,
+                                                  args=(studies[started], pending_nodes, snapshot_dir, worker_pipe))
+                process.start()
+                worker_pipe.close()
+                running[started] = (process, pipe)
+                started += 1
+
+            # Handle messages of workers (worker that exits without results failed)
+            pipes = {pipe: position for position, (process, pipe) in running.items()}
+            for pipe in multiprocessing.connection.wait(list(pipes)):
+                position = pipes[pipe]
+                study_file = studies[position]
+                try:
+                    kind, message = pipe.recv()
+                except EOFError:
+                    kind, message = 'ERROR', 'Worker exited'
+                if kind == 'NODES':
+                    study_nodes[position] = message
+                    continue
+                if kind == 'RESULTS':
+                    gen_data.loc[message.index, ['ADDED', 'ERRORMESSAGE']] = message
+                    print('{}: {} rows, {} added'.format(study_file, len(message),
+                                                         int((message['ADDED'] != '').sum())))
+                else:
+                    # Nodes of study that fails before reporting them aren't routed anywhere
+                    study_nodes.setdefault(position, [])
+                    failed[study_file] = message
+                    print('{}: failed, {}'.format(study_file, message))
+                process, pipe = running.pop(position)
+                pipe.close()
+                process.join()
+
+            # Route rows to studies whose earlier studies all reported nodes
+            while routed < started and routed in study_nodes:
+                study_file = studies[routed]
+                nodes = [node_id for node_id in study_nodes[routed]
+                         if node_study.setdefault(node_id, study_file) == study_file]
+                if routed in running and study_file not in failed:
+                    rows = gen_data.loc[gen_data['NODE'].isin(nodes), GENERATOR_COLUMNS]
+                    study_rows[study_file] = len(rows)
+                    try:
+                        running[routed][1].send(rows)
+                    except OSError:
+                        # Worker exited, reported as failed when its pipe is read
+                        pass
+                routed += 1
+    finally:
+        for process, pipe in running.values():
+            pipe.close()
+            process.join()
+
+    # Check rows with node in no study (errors before node check set, others stay pending)
+    unrouted = gen_data[gen_data['NODE'].map(node_study).isna()].copy()
+    validate_generators(unrouted, pd.Series(np.nan, index=unrouted.index))
+    gen_data.loc[unrouted.index, 'ERRORMESSAGE'] = unrouted['ERRORMESSAGE']
+
+    # Write table to SQL once
+    write_generators(con, cur, gen_data, write_mode, batch_size)
+    return study_rows, failed
+
+
 if __name__ == "__main__":
+    import sys
     import SupportFunctions as Support
-    cmate_con, cmate_cur = Support.oracle_conn('CMATE')
-    create_generator(cmate_con, cmate_cur)
-    cmate_cur.close()
-    cmate_con.close()
+    # Keep running on loaded study with --daemon (connection from pool), otherwise add pending generators once
+    if '--daemon' in sys.argv:
+        cmate_pool = ConnectionPool(lambda: Support.oracle_conn('CMATE'), size=1)
+        run_daemon(cmate_pool)
+        cmate_pool.close()
+    else:
+        cmate_con, cmate_cur = Support.oracle_conn('CMATE')
+        create_generator(cmate_con, cmate_cur)
+        cmate_cur.close()
+        cmate_con.close()
@@ -0,0 +1,394 @@
+"""
+In-process stand-in for the parts of cympy used by AssignConductor and SQLGeneration, backed by a synthetic
+radial feeder (no CYME install or license needed). Every API call is counted in CALLS.
+Install with sys.modules['cympy'] = FakeCympy before importing the modules to benchmark.
+"""
+import collections
+import random
+import types
+
+# Number of calls per API function name
+CALLS = collections.Counter()
+
+# Conductor catalogue per device type number, line ID fields per device type number
+CONDUCTORS = {1: ['336AL', '1/0AL', '4/0AL'], 2: ['1/0AL', '4AL'], 3: ['336AL', '2ACSR'], 4: ['500CU', '1/0CU']}
+FIELDS = {1: ['LineID'],
+          2: ['PhaseConductorIDA', 'PhaseConductorIDB', 'PhaseConductorIDC', 'NeutralConductorID1',
+              'NeutralConductorID2'],
+          3: ['LineID'],
+          4: ['CableID']}
+
+
+class CymError(Exception):
+    """
+    Cyme error
+    """
+
+    def GetMessage(self):
+        return str(self.args[0])
+
+
+class Enum(int):
+    """
+    Integer enum value with name
+    """
+
+    def __new__(cls, name, value):
+        enum_value = int.__new__(cls, value)
+        enum_value.name = name
+        return enum_value
+
+    def __repr__(self):
+        return self.name
+
+
+class DeviceType(object):
+    OverheadLine = Enum('OverheadLine', 1)
+    OverheadByPhase = Enum('OverheadByPhase', 2)
+    OverheadLineUnbalanced = Enum('OverheadLineUnbalanced', 3)
+    Underground = Enum('Underground', 4)
+    Switch = Enum('Switch', 5)
+    ElectronicConverterGenerator = Enum('ElectronicConverterGenerator', 6)
+    SynchronousGenerator = Enum('SynchronousGenerator', 7)
+    InductionGenerator = Enum('InductionGenerator', 8)
+    SpotLoad = Enum('SpotLoad', 9)
+    DistributedLoad = Enum('DistributedLoad', 10)
+
+
+DEVICE_TYPES = {int(value): value for value in vars(DeviceType).values() if isinstance(value, Enum)}
+
+
+class EquipmentType(object):
+    ElectronicConverterGenerator = Enum('ElectronicConverterGenerator', 16)
+    SynchronousGenerator = Enum('SynchronousGenerator', 17)
+    InductionGenerator = Enum('InductionGenerator', 18)
+
+
+class IterationOption(object):
+    Upstream = Enum('Upstream', 0)
+    Downstream = Enum('Downstream', 1)
+
+
+class Node(object):
+    __slots__ = ('ID', 'X', 'Y')
+
+    def __init__(self, node_id='', x=0.0, y=0.0):
+        self.ID = node_id
+        self.X = x
+        self.Y = y
+
+
+class Section(object):
+    __slots__ = ('ID', 'FromNode', 'ToNode')
+
+    def __init__(self, section_id, from_node, to_node):
+        self.ID = section_id
+        self.FromNode = from_node
+        self.ToNode = to_node
+
+
+class Device(object):
+    __slots__ = ('SectionID', 'DeviceNumber', 'DeviceType', 'values')
+
+    def __init__(self, section_id, device_type, values=None, device_number=None):
+        self.SectionID = section_id
+        self.DeviceNumber = section_id if device_number is None else device_number
+        self.DeviceType = device_type
+        self.values = {} if values is None else values
+
+    def GetValue(self, name):
+        CALLS['Device.GetValue'] += 1
+        return self.values.get(name, '')
+
+    def SetValue(self, value, name):
+        CALLS['Device.SetValue'] += 1
+        self.values[name] = value
+
+    def Execute(self, command):
+        CALLS['Device.Execute'] += 1
+        self.values.setdefault('Execute', []).append(command)
+
+
+class Feeder(object):
+    """
+    Synthetic radial feeder (one circuit): sections in top-down order, conductor and load devices,
+    base kV per node, downstream kVA per section
+    Node, section and device IDs are prefixed with circuit name (unique over feeders of a study), device numbers
+    differ from section IDs
+    """
+
+    def __init__(self, sections, default_frac=0.2, seed=1, circuit='FDR1', lateral_frac=0.05, window=30):
+        """
+        Generates feeder, each section fed from one of the last window sections (main line) or, with probability
+        lateral_frac, from any earlier section (lateral)
+        :param sections: Number of sections
+        :param default_frac: Fraction of conductor line IDs set to a default ID
+        :param seed: Random seed
+        :param circuit: Circuit name
+        :param lateral_frac: Fraction of sections fed from any earlier section
+        :param window: Number of last sections main line sections are fed from
+        """
+        rng = random.Random(seed)
+        self.circuit = circuit
+        source_id = circuit + '_SRC'
+        self.nodes = {source_id: Node(source_id)}
+        self.sections = {}
+        self.order = []
+        self.children = {source_id: []}
+        self.parent_section = {}
+        self.devices = {}
+        # Section ID of each device number
+        self.device_sections = {}
+        # Load kVA and load device number of each section with load
+        self.loads = {}
+        self.load_devices = {}
+        self.equipment = {}
+
+        for i in range(sections):
+            # Parent node of section
+            if i == 0:
+                from_id = source_id
+            elif rng.random() < lateral_frac:
+                from_id = circuit + '_N' + str(rng.randrange(i))
+            else:
+                from_id = circuit + '_N' + str(rng.randrange(max(0, i - window), i))
+            to_id = circuit + '_N' + str(i)
+            to_node = Node(to_id, rng.random() * 1000, rng.random() * 1000)
+            self.nodes[to_id] = to_node
+            section = Section(circuit + '_S' + str(i), self.nodes[from_id], to_node)
+            self.add_section(section)
+
+            # Conductor device (or switch, no device), default line IDs with probability default_frac
+            type_draw = rng.random()
+            type_number = 1 if type_draw < .4 else 2 if type_draw < .55 else 3 if type_draw < .65 else \
+                4 if type_draw < .85 else 5
+            if type_number != 5:
+                base = rng.choice(CONDUCTORS[type_number])
+                values = {}
+                for field in FIELDS[type_number]:
+                    if rng.random() < default_frac:
+                        values[field] = 'DEFAULT_' + field
+                    elif rng.random() < .8:
+                        values[field] = base
+                    else:
+                        values[field] = rng.choice(CONDUCTORS[type_number])
+                self.add_device(Device(section.ID, DEVICE_TYPES[type_number], values, circuit + '_D' + str(i)))
+            load_kva = rng.choice([0, 0, 10, 25, 50])
+            if load_kva:
+                self.loads[section.ID] = load_kva
+                self.load_devices[section.ID] = circuit + '_L' + str(i)
+                self.device_sections[circuit + '_L' + str(i)] = section.ID
+
+        self.base_kv = {node_id: rng.choice([12.5, 12.5, 25.0]) for node_id in self.nodes}
+
+        # Downstream kVA of each section, children first
+        self.downstream_kva = {}
+        for section in reversed(self.order):
+            self.downstream_kva[section.ID] = self.loads.get(section.ID, 0) + \
+                sum(self.downstream_kva[child.ID] for child in self.children[section.ToNode.ID])
+
+    def add_section(self, section):
+        self.sections[section.ID] = section
+        self.order.append(section)
+        self.children.setdefault(section.FromNode.ID, []).append(section)
+        self.children.setdefault(section.ToNode.ID, [])
+        self.parent_section[section.ToNode.ID] = section
+
+    def add_device(self, device):
+        self.devices[(device.DeviceNumber, int(device.DeviceType))] = device
+        self.device_sections[device.DeviceNumber] = device.SectionID
+
+    def set_load(self, section_id, load_kva):
+        """
+        Sets kVA of load on section, downstream kVA of section and upstream sections updated
+        """
+        kva_diff = load_kva - self.loads[section_id]
+        self.loads[section_id] = load_kva
+        self.downstream_kva[section_id] += kva_diff
+        node_id = self.sections[section_id].FromNode.ID
+        while node_id in self.parent_section:
+            section = self.parent_section[node_id]
+            self.downstream_kva[section.ID] += kva_diff
+            node_id = section.FromNode.ID
+
+
+# Loaded feeder
+FEEDER = None
+
+
+def load(feeder):
+    """
+    Loads feeder as study, clears call counts
+    :param feeder: Feeder
+    :return: None
+    """
+    global FEEDER
+    FEEDER = feeder
+    CALLS.clear()
+
+
+class NetworkIterator(object):
+    def __init__(self, node_id, option):
+        CALLS['study.NetworkIterator'] += 1
+        self.sequence = []
+        if option == IterationOption.Upstream:
+            depth = 1
+            while node_id in FEEDER.parent_section:
+                section = FEEDER.parent_section[node_id]
+                self.sequence.append((section, depth))
+                depth += 1
+                node_id = section.FromNode.ID
+        else:
+            stack = [(child, 1) for child in reversed(FEEDER.children.get(node_id, []))]
+            while stack:
+                section, depth = stack.pop()
+                self.sequence.append((section, depth))
+                stack.extend((child, depth + 1) for child in reversed(FEEDER.children[section.ToNode.ID]))
+        self.position = -1
+
+    def Next(self):
+        CALLS['NetworkIterator.Next'] += 1
+        self.position += 1
+        return self.position < len(self.sequence)
+
+    def GetSection(self):
+        CALLS['NetworkIterator.GetSection'] += 1
+        return self.sequence[self.position][0]
+
+    def GetDepth(self):
+        return self.sequence[self.position][1]
+
+
+class Study(object):
+    Node = Node
+
+    def Open(self, path):
+        """
+        Loads synthetic feeder named by path '<sections>:<seed>' (circuit name 'FDR<seed>', node IDs 'FDR<seed>_N<i>')
+        """
+        sections, seed = path.split(':')
+        load(Feeder(int(sections), seed=int(seed), circuit='FDR' + seed))
+
+    def Save(self, path=None):
+        CALLS['study.Save'] += 1
+
+    def Close(self, save=False):
+        load(None)
+
+    def ListNetworks(self):
+        CALLS['study.ListNetworks'] += 1
+        return [FEEDER.circuit]
+
+    def ListDevices(self, device_type, network_id=''):
+        CALLS['study.ListDevices'] += 1
+        if device_type == DeviceType.SpotLoad:
+            return [Device(section_id, device_type, device_number=FEEDER.load_devices[section_id])
+                    for section_id in FEEDER.loads]
+        return [device for device in FEEDER.devices.values() if device.DeviceType == device_type]
+
+    def ListSections(self, network_id=''):
+        CALLS['study.ListSections'] += 1
+        return list(FEEDER.order)
+
+    def ListNodes(self, network_id=''):
+        CALLS['study.ListNodes'] += 1
+        return list(FEEDER.nodes.values())
+
+    def GetSection(self, section_id):
+        CALLS['study.GetSection'] += 1
+        return FEEDER.sections.get(section_id)
+
+    def GetNode(self, node_id):
+        CALLS['study.GetNode'] += 1
+        return FEEDER.nodes.get(node_id)
+
+    def GetDevice(self, device_number, device_type):
+        CALLS['study.GetDevice'] += 1
+        device = FEEDER.devices.get((device_number, int(device_type)))
+        if device is None:
+            raise CymError('Device not found: ' + str(device_number))
+        return device
+
+    def QueryInfoNode(self, info, node_id):
+        CALLS['study.QueryInfoNode'] += 1
+        if node_id not in FEEDER.nodes:
+            raise CymError('Node not found: ' + str(node_id))
+        if info == 'KVLLBase':
+            return '{:.1f}'.format(FEEDER.base_kv.get(node_id, 12.5))
+        if info == 'NetworkId':
+            return FEEDER.circuit
+        return ''
+
+    def QueryInfoDevice(self, info, device_number, device_type):
+        CALLS['study.QueryInfoDevice'] += 1
+        if device_number not in FEEDER.device_sections:
+            raise CymError('Device not found: ' + str(device_number))
+        section_id = FEEDER.device_sections[device_number]
+        if info == 'KVAT':
+            return str(float(FEEDER.loads.get(section_id, 0)))
+        return str(float(FEEDER.downstream_kva[section_id]))
+
+    def SetValueDevice(self, value, name, device_number, device_type):
+        CALLS['study.SetValueDevice'] += 1
+        device = FEEDER.devices.get((device_number, int(device_type)))
+        if device is None:
+            raise CymError('Device not found: ' + str(device_number))
+        device.values[name] = value
+
+    def AddSection(self, section_id, network_id, device_number, device_type, from_node_id, to_node):
+        CALLS['study.AddSection'] += 1
+        if section_id in FEEDER.sections:
+            raise CymError('Section already exists: ' + section_id)
+        if from_node_id not in FEEDER.nodes:
+            raise CymError('Node not found: ' + str(from_node_id))
+        FEEDER.nodes[to_node.ID] = to_node
+        FEEDER.base_kv[to_node.ID] = FEEDER.base_kv[from_node_id]
+        FEEDER.add_section(Section(section_id, FEEDER.nodes[from_node_id], to_node))
+        FEEDER.add_device(Device(device_number, device_type))
+
+    def NetworkIterator(self, node_id, option):
+        return NetworkIterator(node_id, option)
+
+
+class Equipment(object):
+    def ListEquipments(self, equipment_type):
+        CALLS['eq.ListEquipments'] += 1
+        return [types.SimpleNamespace(ID=eqid) for eqid, values in FEEDER.equipment.items()
+                if values['Type'] == equipment_type]
+
+    def Add(self, eqid, equipment_type):
+        CALLS['eq.Add'] += 1
+        if eqid in FEEDER.equipment:
+            raise CymError('Equipment already exists: ' + eqid)
+        FEEDER.equipment[eqid] = {'Type': equipment_type}
+
+    def SetValue(self, value, name, eqid, equipment_type):
+        CALLS['eq.SetValue'] += 1
+        FEEDER.equipment[eqid][name] = value
+
+
+# Reports created (title, headers, rows)
+REPORTS = []
+
+
+class CustomReport(object):
+    def __init__(self, title, headers):
+        CALLS['rm.CustomReport'] += 1
+        self.title = title
+        self.headers = headers
+        self.rows = []
+        REPORTS.append(self)
+
+    def AddRow(self, row):
+        self.rows.append(row)
+
+    def Show(self):
+        CALLS['CustomReport.Show'] += 1
+
+
+study = Study()
+eq = Equipment()
+err = types.SimpleNamespace(CymError=CymError)
+enums = types.SimpleNamespace(DeviceType=DeviceType, EquipmentType=EquipmentType, IterationOption=IterationOption)
+rm = types.SimpleNamespace(CustomReport=CustomReport, SectionCell=lambda value: ('SECTION', value),
+                           StringCell=lambda value: ('STRING', value))
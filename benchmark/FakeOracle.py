@@ -0,0 +1,134 @@
+"""
+SQLite-backed stand-in for the Oracle connection and cursor used by SQLGeneration (numbered binds :1, :2, ...
+translated to SQLite ?1, ?2, ..., ROWID works as in Oracle), optional latency per call stands in for network
+round trips
+"""
+import collections
+import random
+import re
+import sqlite3
+import time
+
+# Columns of synthetic GENERATORS table
+GENERATOR_COLUMNS = ['GENID', 'GENERATORTYPE', 'NODE', 'RATEDKVLL', 'ACTIVEGENERATION', 'POWERFACTOR', 'CONTROLTYPE',
+                     'MAXREACTANCE', 'MINREACTANCE', 'ADDED', 'ERRORMESSAGE']
+
+
+class Cursor(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.db.cursor()
+        self.statement = None
+        self.arraysize = 100
+
+    @staticmethod
+    def translate(sql):
+        return re.sub(r':(\d+)', r'?\1', sql)
+
+    def execute(self, sql, parameters=()):
+        self.connection.round_trip('execute')
+        self.cursor.execute(self.translate(sql), parameters)
+        return self
+
+    def prepare(self, sql):
+        self.statement = sql
+
+    def executemany(self, sql, data):
+        self.connection.round_trip('executemany')
+        self.cursor.executemany(self.translate(sql or self.statement), data)
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def fetchall(self):
+        self.connection.round_trip('fetch')
+        return self.cursor.fetchall()
+
+    def fetchmany(self, size=None):
+        self.connection.round_trip('fetch')
+        return self.cursor.fetchmany(size or self.arraysize)
+
+    def fetchone(self):
+        self.connection.round_trip('fetch')
+        return self.cursor.fetchone()
+
+    def close(self):
+        self.cursor.close()
+
+
+class Connection(object):
+    def __init__(self, path=':memory:', calls=None, latency=0.0):
+        """
+        Opens database (file path to open more connections to same database, e.g. one per thread)
+        :param path: SQLite database path
+        :param calls: Counter of calls to share with other connections, None for own counter
+        :param latency: Seconds each execute, executemany, fetch and commit call waits (0 for none)
+        """
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.calls = collections.Counter() if calls is None else calls
+        self.latency = latency
+
+    def round_trip(self, call_name):
+        """
+        Counts call, waits latency (other threads keep running, like a network round trip)
+        :param call_name: Call name
+        """
+        self.calls[call_name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self.round_trip('commit')
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.db.close()
+
+
+def make_generators(rows, node_ids, seed=1, path=':memory:', latency=0.0):
+    """
+    Creates connection with GENERATORS table of synthetic pending generator rows (mix of valid and invalid rows,
+    some nodes not in any feeder)
+    :param rows: Number of rows
+    :param node_ids: List of node IDs rows are placed on
+    :param seed: Random seed
+    :param path: SQLite database path
+    :param latency: Seconds per call of returned connection (table created without latency)
+    :return: Connection
+    """
+    rng = random.Random(seed)
+    con = Connection(path)
+    if path != ':memory:':
+        # Readers don't block writer of another connection (like Oracle)
+        con.db.execute('PRAGMA journal_mode=WAL')
+    con.db.execute('CREATE TABLE GENERATORS (GENID INTEGER, GENERATORTYPE TEXT, NODE TEXT, RATEDKVLL REAL, '
+                   'ACTIVEGENERATION REAL, POWERFACTOR REAL, CONTROLTYPE TEXT, MAXREACTANCE REAL, '
+                   'MINREACTANCE REAL, ADDED INTEGER, ERRORMESSAGE TEXT)')
+    other_ids = ['X' + str(i) for i in range(40)]
+    gen_rows = []
+    for gen_id in range(rows):
+        gen_type = rng.choice(['ECG', 'ECG', 'INDUCTION', 'SYNCHRONOUS', 'WIND'])
+        node_id = None if rng.random() < .05 else rng.choice(node_ids if rng.random() < .95 else other_ids)
+        control_type = rng.choice(['Fixed_Generation', 'Voltage_Controlled', 'Other', None]) \
+            if gen_type == 'SYNCHRONOUS' else None
+        max_reactance, min_reactance = rng.choice([(None, None), (100.0, 50.0), (50.0, 100.0), (10.0, None)])
+        gen_rows.append((gen_id, gen_type, node_id, rng.choice([12.5, 12.5, 25.0, None]),
+                         rng.choice([None, 5.0, 250.0, 1000.0]), rng.choice([None, 90.0, 95.0, 101.0, -5.0, 100.0]),
+                         control_type, max_reactance, min_reactance, None, None))
+    con.db.executemany('INSERT INTO GENERATORS VALUES (' + ', '.join(['?'] * len(GENERATOR_COLUMNS)) + ')',
+                       gen_rows)
+    con.db.commit()
+    con.calls.clear()
+    con.latency = latency
+    return con
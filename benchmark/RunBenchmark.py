@@ -0,0 +1,192 @@
+"""
+Benchmarks AssignConductor and SQLGeneration on synthetic radial feeders with the FakeCympy and FakeOracle
+stand-ins, reports wall time, peak traced memory and cympy/database call counts per scenario
+Run from repository root: python -m benchmark.RunBenchmark --sections 1000 10000 100000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmark import FakeCympy
+from benchmark import FakeOracle
+
+# Modules to benchmark import cympy, stand-in installed first
+sys.modules['cympy'] = FakeCympy
+
+import AssignConductor
+import SQLGeneration
+
+
+def setup_fix_cond(sections, options):
+    """
+    Loads feeder for fix_cond scenario
+    :param sections: Number of sections
+    :param options: Parsed command line options
+    :return: None
+    """
+    FakeCympy.load(FakeCympy.Feeder(sections, default_frac=options.default_frac, seed=options.seed))
+    return None
+
+
+def run_fix_cond(state, options):
+    """
+    Assigns default conductors of loaded feeder
+    :param state: Unused
+    :param options: Parsed command line options
+    :return: Number of rows (changed conductors)
+    """
+    changed_dictionary, default_dictionary = AssignConductor.fix_ckt_cond(
+        FakeCympy.FEEDER.circuit, options.max_depth, options.max_kva_diff, ['DEFAULT', 'N/A'],
+        kva_mode=options.kva_mode, retry_mode=options.retry_mode)
+    return len(changed_dictionary)
+
+
+def setup_create_generator(sections, options):
+    """
+    Loads feeder and creates generator backlog for create_generator scenario
+    :param sections: Number of sections
+    :param options: Parsed command line options
+    :return: Connection
+    """
+    feeder = FakeCympy.Feeder(sections, default_frac=options.default_frac, seed=options.seed)
+    FakeCympy.load(feeder)
+    rows = options.generators if options.generators is not None else max(1, sections // 10)
+    # Database file (pipeline writer opens its own connection to it), removed first if left by earlier run
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.isfile(options.database + suffix):
+            os.remove(options.database + suffix)
+    return FakeOracle.make_generators(rows, list(feeder.nodes), seed=options.seed, path=options.database,
+                                      latency=options.db_latency)
+
+
+def connect(path, calls, latency):
+    """
+    Opens another connection to benchmark database
+    :param path: SQLite database path
+    :param calls: Counter of calls of benchmark connection
+    :param latency: Seconds per database call
+    :return: Connection, cursor
+    """
+    con = FakeOracle.Connection(path, calls, latency)
+    return con, con.cursor()
+
+
+def run_create_generator(con, options):
+    """
+    Adds generators of backlog to loaded feeder
+    :param con: Connection from setup_create_generator
+    :param options: Parsed command line options
+    :return: Number of rows added
+    """
+    cur = con.cursor()
+    pool = SQLGeneration.ConnectionPool(lambda: connect(options.database, con.calls, options.db_latency))
+    SQLGeneration.create_generator(con, cur, write_mode=options.write_mode, chunk_size=options.chunk_size,
+                                   pipeline=options.pipeline, pool=pool)
+    pool.close()
+    cur.close()
+    return con.db.execute('SELECT COUNT(*) FROM GENERATORS WHERE ADDED = 1').fetchone()[0]
+
+
+# Scenario name to (setup function, run function)
+SCENARIOS = {'fix_cond': (setup_fix_cond, run_fix_cond),
+             'create_generator': (setup_create_generator, run_create_generator)}
+
+
+def run_scenario(name, sections, options):
+    """
+    Runs scenario once timed (call counts taken from this run) and once under tracemalloc for peak memory
+    (setup not measured)
+    :param name: Scenario name
+    :param sections: Number of sections
+    :param options: Parsed command line options
+    :return: Result dictionary
+    """
+    setup, run = SCENARIOS[name]
+
+    state = setup(sections, options)
+    FakeCympy.CALLS.clear()
+    gc.collect()
+    start_time = time.perf_counter()
+    rows = run(state, options)
+    wall_time = time.perf_counter() - start_time
+    calls = dict(FakeCympy.CALLS)
+    if isinstance(state, FakeOracle.Connection):
+        calls.update(('db.' + call_name, count) for call_name, count in state.calls.items())
+        state.close()
+
+    peak = None
+    if options.memory:
+        state = setup(sections, options)
+        gc.collect()
+        tracemalloc.start()
+        run(state, options)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if isinstance(state, FakeOracle.Connection):
+            state.close()
+
+    FakeCympy.load(None)
+    return {'SCENARIO': name, 'SECTIONS': sections, 'ROWS': rows, 'WALLTIME': wall_time, 'PEAKMEMORY': peak,
+            'CALLS': calls}
+
+
+def main(argv=None):
+    """
+    Runs benchmark scenarios from command line
+    :param argv: Command line arguments (None for sys.argv)
+    :return: List of result dictionaries
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--sections', nargs='+', type=int, default=[1000, 10000, 100000],
+                        help='Feeder sizes (1000 to 1000000 sections)')
+    parser.add_argument('--default-frac', type=float, default=0.2, help='Fraction of default conductor IDs')
+    parser.add_argument('--generators', type=int, default=None,
+                        help='Generator backlog rows (default one per 10 sections)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='Skip tracemalloc run (peak memory)')
+    parser.add_argument('--json', default=None, help='Write results to JSON file')
+    # fix_ckt_cond settings
+    parser.add_argument('--max-depth', type=int, default=3)
+    parser.add_argument('--max-kva-diff', type=float, default=0.1)
+    parser.add_argument('--kva-mode', default='QUERY', choices=['QUERY', 'ACCUMULATE'])
+    parser.add_argument('--retry-mode', default='SINGLE', choices=['SINGLE', 'FIXPOINT'])
+    # create_generator settings
+    parser.add_argument('--write-mode', default='REPLACE', choices=['REPLACE', 'DELTA'])
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--pipeline', action='store_true')
+    parser.add_argument('--database', default=os.path.join(tempfile.gettempdir(), 'benchmark_generators.db'),
+                        help='SQLite file of generator backlog')
+    parser.add_argument('--db-latency', type=float, default=0.0,
+                        help='Seconds each database call waits (stands in for Oracle round trips)')
+    options = parser.parse_args(argv)
+
+    # Import pandas and numpy (imported inside SQLGeneration functions) so first scenario doesn't time imports
+    import pandas
+    import numpy
+
+    results = []
+    for name in options.scenarios:
+        for sections in options.sections:
+            result = run_scenario(name, sections, options)
+            results.append(result)
+            top_calls = sorted(result['CALLS'].items(), key=lambda item: -item[1])[:5]
+            print('{:<17} {:>8} sections {:>8} rows {:>9.3f} s {:>10} peak   {}'.format(
+                name, sections, result['ROWS'], result['WALLTIME'],
+                '-' if result['PEAKMEMORY'] is None else '{:.1f} MB'.format(result['PEAKMEMORY'] / 1e6),
+                ', '.join('{} {}'.format(call_name, count) for call_name, count in top_calls)))
+
+    if options.json is not None:
+        with open(options.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
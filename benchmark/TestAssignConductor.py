@@ -0,0 +1,163 @@
+"""
+Checks fix_ckt_cond (conductor table and topology snapshot walks) assigns the same conductors as the original
+per-conductor NetworkIterator walk, on the FakeCympy stand-in
+Run from repository root: python -m unittest benchmark.TestAssignConductor
+"""
+import sys
+import unittest
+
+from benchmark import FakeCympy
+
+# Modules to test import cympy, stand-in installed first
+sys.modules['cympy'] = FakeCympy
+
+import AssignConductor
+
+cympy = FakeCympy
+
+
+def is_default(cond_id, default_ids):
+    return any(default_id in cond_id for default_id in default_ids)
+
+
+def walk_cond(old_cond, up_dw, conductor_dict, line_id_names, depth_max, kva_diff_max, default_ids):
+    """
+    Original get_cond: looks for upstream/downstream conductor with a Cyme network iterator
+    """
+    sect = cympy.study.GetSection(old_cond.SectionID)
+    sect_dw_kva = float(cympy.study.QueryInfoDevice('DwKVAT', old_cond.DeviceNumber, old_cond.DeviceType))
+    new_cond = {line_id_name: 'N/A' for line_id_name in line_id_names}
+    in_kva = False
+
+    if up_dw == 'UP':
+        it = cympy.study.NetworkIterator(sect.FromNode.ID, cympy.enums.IterationOption.Upstream)
+    else:
+        it = cympy.study.NetworkIterator(sect.ToNode.ID, cympy.enums.IterationOption.Downstream)
+
+    while it.Next():
+        # Default section itself not counted
+        if it.GetSection() == sect:
+            depth_max += 1
+            continue
+        if it.GetDepth() > depth_max:
+            if up_dw == 'UP':
+                break
+            continue
+
+        in_kva = False
+        cond = conductor_dict.get(it.GetSection().ID)
+        if cond is None:
+            continue
+        if cond.DeviceType != old_cond.DeviceType:
+            break
+        if sect_dw_kva != 0 and abs(float(cympy.study.QueryInfoDevice('DwKVAT', cond.DeviceNumber, cond.DeviceType))
+                                    - sect_dw_kva) / sect_dw_kva < kva_diff_max:
+            in_kva = True
+
+        sect_conductors = new_cond.copy()
+        good_line_ids = []
+        for line_id_name in line_id_names:
+            line_id = cond.GetValue(line_id_name)
+            if is_default(line_id, default_ids):
+                break
+            if sect_conductors[line_id_name] == 'N/A':
+                sect_conductors[line_id_name] = line_id
+            elif sect_conductors[line_id_name] != line_id:
+                sect_conductors[line_id_name] = 'CA'
+            good_line_ids.append((sect_conductors[line_id_name] != 'N/A' and in_kva) or
+                                 sect_conductors[line_id_name] == 'CA')
+        else:
+            new_cond = sect_conductors
+            if all(good_line_ids):
+                break
+
+    for line_id_name in line_id_names:
+        if new_cond[line_id_name] == 'N/A':
+            new_cond[line_id_name] = 'CA'
+
+    return new_cond, in_kva
+
+
+def walk_assign(cond, line_id_names, conductor_dict, changed_dict, ir_dict, depth_max, kva_diff_max, default_ids):
+    """
+    Original assign_cond: sets conductor IDs in Cyme as they are decided
+    """
+    up_cond, up_kva = walk_cond(cond, 'UP', conductor_dict, line_id_names, depth_max, kva_diff_max, default_ids)
+    down_cond, down_kva = walk_cond(cond, 'DOWN', conductor_dict, line_id_names, depth_max, kva_diff_max,
+                                    default_ids)
+
+    for line_id_name in line_id_names:
+        up_id, down_id = up_cond[line_id_name], down_cond[line_id_name]
+        if up_id == 'CA' and down_id == 'CA':
+            ir_dict[(cond.SectionID, line_id_name)] = (cond.SectionID, up_id, down_id, line_id_name, cond)
+            continue
+        # Upstream if only upstream found or only upstream within kVA, else downstream
+        if down_id == 'CA' or (up_id != 'CA' and up_id != down_id and up_kva and not down_kva):
+            new_id = up_id
+        else:
+            new_id = down_id
+        changed_dict[(cond.SectionID, line_id_name)] = (cond.SectionID, cond.GetValue(line_id_name), new_id,
+                                                        line_id_name)
+        cond.SetValue(new_id, line_id_name)
+
+
+def walk_fix_cond(depth_max, kva_diff_max, default_ids):
+    """
+    Original fix_cond (without reports) on loaded feeder
+    :return: Changed dictionary, input required dictionary (records as tuples, keyed by (section ID, line ID field))
+    """
+    conductor_dict = {}
+    default_lists = {device_type: [] for device_type in AssignConductor.LINE_ID_FIELDS}
+    for device_type, line_id_names in AssignConductor.LINE_ID_FIELDS.items():
+        for cond in cympy.study.ListDevices(device_type):
+            if cond.SectionID not in conductor_dict:
+                conductor_dict[cond.SectionID] = cond
+                if any(is_default(cond.GetValue(line_id_name), default_ids) for line_id_name in line_id_names):
+                    default_lists[device_type].append(cond)
+
+    changed_dict = {}
+    ir_dict = {}
+    device_type = cympy.enums.DeviceType
+    for default_type in (device_type.OverheadLine, device_type.OverheadByPhase, device_type.Underground):
+        conds = default_lists[default_type]
+        if default_type == device_type.OverheadLine:
+            conds = conds + default_lists[device_type.OverheadLineUnbalanced]
+        for cond in conds:
+            walk_assign(cond, AssignConductor.LINE_ID_FIELDS[cond.DeviceType], conductor_dict, changed_dict,
+                        ir_dict, depth_max, kva_diff_max, default_ids)
+
+    default_dict = {}
+    for sect_id, up_id, down_id, line_id_name, cond in ir_dict.values():
+        walk_assign(cond, [line_id_name], conductor_dict, changed_dict, default_dict, depth_max, kva_diff_max,
+                    default_ids)
+
+    return changed_dict, {ir_key: ir_cond[:4] for ir_key, ir_cond in default_dict.items()}
+
+
+class TestAssignConductor(unittest.TestCase):
+
+    def check_feeder(self, seed, kva_mode):
+        # Same feeder fixed by original walk and by fix_ckt_cond
+        walk_feeder = FakeCympy.Feeder(1500, seed=seed)
+        feeder = FakeCympy.Feeder(1500, seed=seed)
+        FakeCympy.load(walk_feeder)
+        walk_changed, walk_default = walk_fix_cond(3, 0.1, ['DEFAULT', 'N/A'])
+        FakeCympy.load(feeder)
+        changed_dictionary, default_dictionary = \
+            AssignConductor.fix_ckt_cond(feeder.circuit, 3, 0.1, ['DEFAULT', 'N/A'], kva_mode=kva_mode)
+
+        self.assertTrue(walk_changed and walk_default)
+        self.assertEqual({key: tuple(record)[:4] for key, record in changed_dictionary.items()}, walk_changed)
+        self.assertEqual({key: tuple(record)[:4] for key, record in default_dictionary.items()}, walk_default)
+        self.assertEqual({device_key: device.values for device_key, device in feeder.devices.items()},
+                         {device_key: device.values for device_key, device in walk_feeder.devices.items()})
+
+    def test_same_as_network_iterator_walk(self):
+        for seed in (1, 2, 3, 4):
+            for kva_mode in ('QUERY', 'ACCUMULATE'):
+                with self.subTest(seed=seed, kva_mode=kva_mode):
+                    self.check_feeder(seed, kva_mode)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Checks checkpointed create_generator runs resume without placing a batch twice, on the FakeCympy and FakeOracle
+stand-ins
+Run from repository root: python -m unittest benchmark.TestCheckpoint
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from benchmark import FakeCympy
+from benchmark import FakeOracle
+
+# Modules to test import cympy, stand-in installed first
+sys.modules['cympy'] = FakeCympy
+
+import SQLGeneration
+
+
+class Crash(Exception):
+    """
+    Simulated crash of run
+    """
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.mkdtemp()
+        self.study_file = os.path.join(self.checkpoint_dir, 'FDR1.sxst')
+        self.feeder = FakeCympy.Feeder(300, seed=1)
+        FakeCympy.load(self.feeder)
+        self.con = FakeOracle.make_generators(400, list(self.feeder.nodes), seed=1)
+        self.add_section = FakeCympy.study.AddSection
+        self.write_generators = SQLGeneration.write_generators
+
+    def tearDown(self):
+        FakeCympy.study.AddSection = self.add_section
+        SQLGeneration.write_generators = self.write_generators
+        self.con.close()
+        shutil.rmtree(self.checkpoint_dir)
+
+    def fail_add_section(self, count):
+        """
+        Makes first n AddSection calls fail
+        """
+        calls = [0]
+
+        def add_section(*args):
+            calls[0] += 1
+            if calls[0] <= count:
+                raise FakeCympy.CymError('Section could not be added')
+            return self.add_section(*args)
+
+        FakeCympy.study.AddSection = add_section
+
+    def crash_write(self, batch):
+        """
+        Makes run crash before n-th batch is written (after study is saved)
+        """
+        calls = [0]
+
+        def write_generators(*args, **kwargs):
+            calls[0] += 1
+            if calls[0] == batch:
+                raise Crash()
+            return self.write_generators(*args, **kwargs)
+
+        SQLGeneration.write_generators = write_generators
+
+    def run_generators(self):
+        cur = self.con.cursor()
+        SQLGeneration.create_generator(self.con, cur, write_mode='DELTA', chunk_size=40, study_file=self.study_file,
+                                       checkpoint_dir=self.checkpoint_dir)
+
+    def generator_devices(self):
+        return sum(1 for device in self.feeder.devices.values()
+                   if device.DeviceType in (FakeCympy.DeviceType.ElectronicConverterGenerator,
+                                            FakeCympy.DeviceType.SynchronousGenerator,
+                                            FakeCympy.DeviceType.InductionGenerator))
+
+    def added_rows(self):
+        return self.con.db.execute('SELECT COUNT(*) FROM GENERATORS WHERE ADDED = 1').fetchone()[0]
+
+    def test_resume_after_failed_add_section(self):
+        # Earlier batches have failed AddSections, crash after study of later batch is saved but not committed
+        self.fail_add_section(8)
+        self.crash_write(4)
+        with self.assertRaises(Crash):
+            self.run_generators()
+        SQLGeneration.write_generators = self.write_generators
+        self.run_generators()
+
+        self.assertGreater(self.added_rows(), 0)
+        self.assertEqual(self.generator_devices(), self.added_rows())
+        self.assertEqual(self.con.db.execute('SELECT COUNT(*) FROM GENERATORS WHERE ADDED IS NULL AND '
+                                             'ERRORMESSAGE IS NULL AND NODE IN (' +
+                                             ', '.join("'" + node_id + "'" for node_id in self.feeder.nodes) +
+                                             ')').fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Checks fix_ckt_cond runs with a warm feeder cache see line ID and load edits made in Cyme since the cache was
+written, on the FakeCympy stand-in
+Run from repository root: python -m unittest benchmark.TestFeederCache
+"""
+import math
+import shutil
+import sys
+import tempfile
+import unittest
+
+from benchmark import FakeCympy
+
+# Modules to test import cympy, stand-in installed first
+sys.modules['cympy'] = FakeCympy
+
+import AssignConductor
+
+
+class TestFeederCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.feeder = FakeCympy.Feeder(2000, seed=3)
+        FakeCympy.load(self.feeder)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def fix_ckt_cond(self, feeder, cache_dir):
+        FakeCympy.load(feeder)
+        return AssignConductor.fix_ckt_cond(feeder.circuit, 3, 0.1, ['DEFAULT', 'N/A'], cache_dir=cache_dir)
+
+    def get_ckt_data(self, feeder, kva_mode, cache_dir):
+        FakeCympy.load(feeder)
+        conductor_table, oh_list, oh_phase_list, ug_list, topology, kva_cache = \
+            AssignConductor.get_ckt_data(feeder.circuit, AssignConductor.DefaultMatcher(['DEFAULT', 'N/A']),
+                                         kva_mode, cache_dir)
+        return conductor_table, topology['PARENT'], [None if math.isnan(kva) else kva for kva in kva_cache.kva]
+
+    def test_line_id_edited_after_cached_run(self):
+        # Same feeder run with and without cache, conductor set to a default ID in Cyme after first run
+        uncached_feeder = FakeCympy.Feeder(2000, seed=3)
+        self.fix_ckt_cond(self.feeder, self.cache_dir)
+        self.fix_ckt_cond(uncached_feeder, None)
+        device_key = next(device_key for device_key, device in self.feeder.devices.items()
+                          if device.DeviceType == FakeCympy.DeviceType.OverheadLine and
+                          'DEFAULT' not in device.values['LineID'])
+        for feeder in (self.feeder, uncached_feeder):
+            feeder.devices[device_key].values['LineID'] = 'DEFAULT_IMPORTED'
+
+        changed_dictionary, default_dictionary = self.fix_ckt_cond(self.feeder, self.cache_dir)
+        uncached_changed, uncached_default = self.fix_ckt_cond(uncached_feeder, None)
+
+        section_id = self.feeder.devices[device_key].SectionID
+        self.assertTrue((section_id, 'LineID') in changed_dictionary or (section_id, 'LineID') in default_dictionary)
+        self.assertEqual(changed_dictionary, uncached_changed)
+        self.assertEqual(default_dictionary.keys(), uncached_default.keys())
+        self.assertEqual({device_key: device.values for device_key, device in self.feeder.devices.items()},
+                         {device_key: device.values for device_key, device in uncached_feeder.devices.items()})
+
+    def test_load_edited_after_cached_run(self):
+        for kva_mode in ('QUERY', 'ACCUMULATE'):
+            # Warm cache, then change a load in Cyme
+            self.get_ckt_data(self.feeder, kva_mode, self.cache_dir)
+            section_id = next(iter(self.feeder.loads))
+            self.feeder.set_load(section_id, self.feeder.loads[section_id] + 500)
+
+            self.assertEqual(self.get_ckt_data(self.feeder, kva_mode, self.cache_dir),
+                             self.get_ckt_data(self.feeder, kva_mode, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
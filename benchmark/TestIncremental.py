@@ -0,0 +1,100 @@
+"""
+Checks incremental fix_ckt_cond runs (state directory given) end with the same circuit as full runs, on the FakeCympy
+stand-in
+Run from repository root: python -m unittest benchmark.TestIncremental
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmark import FakeCympy
+
+# Modules to test import cympy, stand-in installed first
+sys.modules['cympy'] = FakeCympy
+
+import AssignConductor
+
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        # Same feeder run incrementally and fully
+        self.feeder = FakeCympy.Feeder(2000, seed=5)
+        self.full_feeder = FakeCympy.Feeder(2000, seed=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def fix_ckt_cond(self, feeder, state_dir, cache_dir=None):
+        FakeCympy.load(feeder)
+        return AssignConductor.fix_ckt_cond(feeder.circuit, 3, 0.1, ['DEFAULT', 'N/A'], retry_mode='FIXPOINT',
+                                            cache_dir=cache_dir, state_dir=state_dir)
+
+    def run_both(self, cache_dir=None):
+        incremental = self.fix_ckt_cond(self.feeder, self.state_dir, cache_dir)
+        full = self.fix_ckt_cond(self.full_feeder, None)
+        return incremental, full
+
+    def edit_both(self):
+        # Set a conductor assigned by first run back to a default in Cyme
+        device_key = next(device_key for device_key, device in self.feeder.devices.items()
+                          if device.DeviceType == FakeCympy.DeviceType.OverheadLine and
+                          'DEFAULT' not in device.values['LineID'])
+        for feeder in (self.feeder, self.full_feeder):
+            feeder.devices[device_key].values['LineID'] = 'DEFAULT'
+        return self.feeder.devices[device_key].SectionID
+
+    def assertSameCircuit(self, incremental, full):
+        self.assertEqual({device_key: device.values for device_key, device in self.feeder.devices.items()},
+                         {device_key: device.values for device_key, device in self.full_feeder.devices.items()})
+        # Input required conductors of unchanged neighbourhoods carried forward
+        self.assertEqual(incremental[1].keys(), full[1].keys())
+
+    def check_edit_after_run(self, cache_dir):
+        self.run_both(cache_dir)
+        section_id = self.edit_both()
+        incremental, full = self.run_both(cache_dir)
+
+        self.assertTrue((section_id, 'LineID') in incremental[0] or (section_id, 'LineID') in incremental[1])
+        self.assertSameCircuit(incremental, full)
+
+    def test_edit_after_run(self):
+        self.check_edit_after_run(None)
+
+    def test_edit_after_cached_run(self):
+        self.check_edit_after_run(self.cache_dir)
+
+    def test_truncated_state(self):
+        # State file cut short (crash while written before writes went through a temporary file), full run instead
+        self.run_both()
+        state_file = AssignConductor.get_state_file(self.state_dir, self.feeder.circuit)
+        with open(state_file, 'r+') as json_file:
+            json_file.truncate(os.path.getsize(state_file) // 2)
+        self.edit_both()
+
+        self.assertSameCircuit(*self.run_both())
+        with open(state_file) as json_file:
+            self.assertIn('SETTINGS', json.load(json_file))
+
+    def test_crash_while_saving_state(self):
+        self.run_both()
+        state_file = AssignConductor.get_state_file(self.state_dir, self.feeder.circuit)
+        with open(state_file) as json_file:
+            state = json.load(json_file)
+
+        with mock.patch('os.replace', side_effect=OSError('Disk full')):
+            with self.assertRaises(OSError):
+                AssignConductor.save_cond_state(self.state_dir, self.feeder.circuit, dict(state, SECTIONS=[]))
+        self.assertEqual(AssignConductor.load_cond_state(self.state_dir, self.feeder.circuit, state['SETTINGS']),
+                         state)
+
+
+if __name__ == '__main__':
+    unittest.main()
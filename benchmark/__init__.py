@@ -0,0 +1,3 @@
+"""
+Benchmarks of AssignConductor and SQLGeneration without CYME or Oracle (FakeCympy, FakeOracle stand-ins)
+"""